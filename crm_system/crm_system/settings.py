@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
 import os
 from dotenv import load_dotenv
@@ -47,6 +48,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'system_app.middleware.PerformanceMiddleware',
+    # brotli/gzip: ниже PerformanceMiddleware, чтобы в метрики попадал размер сжатого ответа
+    'system_app.middleware.CompressionMiddleware',
+    'system_app.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,13 +84,105 @@ WSGI_APPLICATION = 'crm_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE=postgresql — PostgreSQL (нужен psycopg[binary,pool]); по умолчанию SQLite в режиме WAL
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 0))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'crm_med'),
+            'USER': os.getenv('DB_USER', 'postgres'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', '127.0.0.1'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # по умолчанию 0: под ASGI каждый запрос открывает соединение в новом потоке, и постоянные
+            # соединения там копятся до max_connections — для ASGI используйте пул (DB_POOL_MAX_SIZE).
+            # DB_CONN_MAX_AGE=60 — только для WSGI. С пулом psycopg CONN_MAX_AGE должен быть 0.
+            'CONN_MAX_AGE': 0 if DB_POOL_MAX_SIZE else int(os.getenv('DB_CONN_MAX_AGE', 0)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
+    }
+    if DB_POOL_MAX_SIZE:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # ждать блокировку вместо "database is locked"; BEGIN IMMEDIATE берёт блокировку
+                # записи в начале транзакции, а не при первом INSERT (там SQLite не может ждать)
+                'timeout': int(os.getenv('SQLITE_TIMEOUT', 20)),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# Реплики только для чтения: DB_REPLICA_HOSTS=host1,host2 (PostgreSQL) или DB_REPLICA_NAMES=/path/a.sqlite3 (SQLite).
+# Безопасные запросы читают модели system_app с реплик (system_app.routers), запись — всегда в default.
+_replicas = [name for name in os.getenv('DB_REPLICA_HOSTS' if DB_ENGINE == 'postgresql' else 'DB_REPLICA_NAMES',
+                                        '').split(',') if name]
+for _number, _name in enumerate(_replicas, 1):
+    DATABASES[f'replica_{_number}'] = {
+        **DATABASES['default'],
+        'HOST' if DB_ENGINE == 'postgresql' else 'NAME': _name,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [f'replica_{number}' for number in range(1, len(_replicas) + 1)]
+DATABASE_ROUTERS = ['system_app.routers.ReplicaRouter']
+REPLICA_APP_LABELS = ['system_app']
+# Сколько секунд после записи клиент читает только с primary (read-after-write)
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+# Выполняются на каждом новом соединении SQLite (system_app.signals.configure_sqlite).
+# busy_timeout здесь не задаётся: его выставляет OPTIONS['timeout'] (SQLITE_TIMEOUT).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -32000,
+    'temp_store': 'MEMORY',
+    'mmap_size': 134217728,
+}
+
+
+# Cache
+# По умолчанию локальная память процесса; для нескольких воркеров задайте общий бэкенд,
+# например CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'crm-default'),
     }
 }
 
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', 60 * 60 * 24))
+
+
+# Push-канал живой очереди (/system/events/): брокер и глубина истории для переподключения
+
+QUEUE_EVENTS_BROKER = os.getenv('QUEUE_EVENTS_BROKER', 'system_app.events.InMemoryBroker')
+QUEUE_EVENTS_BUFFER = int(os.getenv('QUEUE_EVENTS_BUFFER', 1000))
+
+
+# Метрики запросов (/metrics, manage.py perf_metrics)
+
+PERF_METRICS_ENABLED = os.getenv('PERF_METRICS_ENABLED', '1') == '1'
+PERF_METRICS_SAMPLE_RATE = float(os.getenv('PERF_METRICS_SAMPLE_RATE', 1.0))
+PERF_METRICS_RESERVOIR = 1000
+PERF_METRICS_FLUSH_SECONDS = 10
+# /metrics отдаётся только с этих адресов (скрейпер Prometheus) или сотрудникам (is_staff) из админки
+PERF_METRICS_ALLOWED_IPS = [ip for ip in os.getenv('PERF_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -106,6 +203,25 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Хеширование паролей: PASSWORD_HASHER=pbkdf2|argon2|bcrypt (argon2 и bcrypt требуют argon2-cffi / bcrypt).
+# По умолчанию параметры Django; снизить стоимость входа можно только явно через env
+# (например, PASSWORD_PBKDF2_ITERATIONS=600000 — минимум OWASP). Хеш с другими параметрами
+# перехешируется при следующем входе (must_update), поэтому смена в любую сторону применяется ко всем.
+
+_HASHERS = {
+    'pbkdf2': 'users.hashers.PBKDF2PasswordHasher',
+    'argon2': 'users.hashers.Argon2PasswordHasher',
+    'bcrypt': 'users.hashers.BCryptSHA256PasswordHasher',
+}
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2')
+# выбранный хешер первым (им пишутся новые хеши), остальные — для проверки старых
+PASSWORD_HASHERS = [_HASHERS[PASSWORD_HASHER]] + [path for name, path in _HASHERS.items() if name != PASSWORD_HASHER]
+for _name in ('PASSWORD_PBKDF2_ITERATIONS', 'PASSWORD_ARGON2_TIME_COST', 'PASSWORD_ARGON2_MEMORY_COST',
+              'PASSWORD_ARGON2_PARALLELISM', 'PASSWORD_BCRYPT_ROUNDS'):
+    if os.getenv(_name):
+        globals()[_name] = int(os.environ[_name])
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -128,6 +244,17 @@ STATIC_ROOT = BASE_DIR / 'staticfiles/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Архив пациентов (manage.py archive_patients): старше скольких дней переносить и размер пачки на транзакцию
+PATIENT_ARCHIVE_AFTER_DAYS = int(os.getenv('PATIENT_ARCHIVE_AFTER_DAYS', 180))
+PATIENT_ARCHIVE_BATCH_SIZE = 1000
+
+# История болезни (MedicalRecord): тексты от этого размера в байтах хранятся сжатыми zlib; None — не сжимать
+MEDICAL_HISTORY_COMPRESS_MIN_BYTES = 512
+
+# Уменьшенные копии аватаров (квадрат, px); PROFILE_PICTURE_ASYNC=False — обрабатывать сразу после коммита
+PROFILE_PICTURE_SIZES = {'small': 64, 'medium': 160, 'large': 400}
+PROFILE_PICTURE_ASYNC = os.getenv('PROFILE_PICTURE_ASYNC', 'true').lower() != 'false'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -143,10 +270,47 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
     "UPDATE_LAST_LOGIN": False,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.ClaimsTokenRefreshSerializer",
+    "TOKEN_VERIFY_SERIALIZER": "users.serializers.ClaimsTokenVerifySerializer",
 }
 
+# Отзыв refresh-токенов (users.revocation): фильтр Блума перед таблицей RevokedToken.
+# Ёмкость и доля ложных срабатываний задают размер фильтра (~1.8 МБ на 1 млн jti при 0.001);
+# раз в REBUILD_SECONDS фильтр перестраивается из БД без истёкших токенов, новые отзывы догружаются
+# по ревизии в кэше и не реже раза в SYNC_SECONDS. Фильтр работает только с общим кэшем:
+# SHARED_CACHE = None определяет это по CACHES (LocMemCache — не общий, проверка идёт в БД).
+TOKEN_REVOCATION_BLOOM_CAPACITY = 100_000
+TOKEN_REVOCATION_BLOOM_ERROR_RATE = 0.001
+TOKEN_REVOCATION_REBUILD_SECONDS = 60 * 60
+TOKEN_REVOCATION_SYNC_SECONDS = 5
+TOKEN_REVOCATION_SHARED_CACHE = None
+# Сколько версия пользователя (users.tokens) живёт в общем кэше; без общего кэша читается из БД
+TOKEN_VERSION_CACHE_SECONDS = 5
+
+# Размер пачки для /system/patient/bulk_create/
+PATIENT_BULK_CREATE_BATCH_SIZE = int(os.getenv('PATIENT_BULK_CREATE_BATCH_SIZE', 500))
+
+# Списки пациентов, услуг и врачей собираются из values_list без ModelSerializer на каждую строку
+# (system_app.fast_serializers); False — обычные сериализаторы DRF.
+FAST_LIST_SERIALIZERS = os.getenv('FAST_LIST_SERIALIZERS', 'true').lower() != 'false'
+
+# Форматы ответа (system_app.renderers): JSON через orjson, если установлен; MessagePack — по
+# Accept: application/msgpack, если установлен msgpack. Сжатие brotli — при установленном brotli.
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'users.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'system_app.renderers.ORJSONRenderer',
+        *(['system_app.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'system_app.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
\ No newline at end of file
@@ -0,0 +1,6 @@
+"""Настройки для ``manage.py test``: рабочие настройки плюс то, что нужно только тестам."""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+# отдельная пустая БД вместо реплики: тесты роутера включают её через override_settings(DATABASE_REPLICAS=...)
+DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
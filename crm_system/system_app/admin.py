@@ -1,9 +1,110 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
 from .models import *
+from .pagination import ApproximateCountPaginator
+from .search import matching_ids
+
+# Сколько совпадений поиска пациентов показывать в админке
+ADMIN_SEARCH_LIMIT = 1000
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Для больших таблиц: приблизительный счётчик строк и без второго COUNT(*) по всей таблице."""
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+@admin.register(Patient)
+class PatientAdmin(LargeTableAdmin):
+    list_display = ('full_name', 'phone_number', 'doctor', 'department', 'service', 'type_record', 'created_date')
+    list_select_related = ('doctor', 'department', 'service')
+    list_filter = ('type_record', 'department')
+    # индекс patient_created_idx (created_date, id)
+    date_hierarchy = 'created_date'
+    ordering = ('-created_date', '-id')
+    search_fields = ('full_name', 'phone_number')
+    autocomplete_fields = ('department', 'service')
+    raw_id_fields = ('doctor', 'reception')
+    filter_horizontal = ('recording_time',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # поиск через триграммный индекс (system_app.search), а не LIKE по всей таблице
+        if not search_term:
+            return queryset, False
+        return queryset.filter(id__in=matching_ids(search_term, ADMIN_SEARCH_LIMIT)), False
+
+
+@admin.register(ArchivedPatient)
+class ArchivedPatientAdmin(LargeTableAdmin):
+    list_display = ('id', 'full_name', 'doctor', 'department', 'type_record', 'created_date', 'archived_date')
+    list_select_related = ('doctor', 'department')
+    date_hierarchy = 'created_date'
+    ordering = ('-created_date', '-id')
+    raw_id_fields = ('department', 'service', 'doctor', 'reception')
+
+
+@admin.register(MedicalRecord)
+class MedicalRecordAdmin(LargeTableAdmin):
+    """Только просмотр: версии добавляются через API (system_app.history.append)."""
+    list_display = ('patient', 'version', 'author', 'compression', 'created_date')
+    list_select_related = ('patient', 'author')
+    fields = readonly_fields = ('patient', 'version', 'author', 'created_date', 'text')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(UserProfile)
+class UserProfileAdmin(UserAdmin):
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    list_display = ('username', 'fio', 'role', 'phone_number', 'is_active')
+    list_filter = ('role', 'is_active', 'is_staff')
+    search_fields = ('username', 'fio', 'phone_number')
+    filter_horizontal = ('specialty', 'groups', 'user_permissions')
+    fieldsets = UserAdmin.fieldsets + (
+        ('Профиль', {'fields': ('fio', 'role', 'phone_number', 'age', 'profile_picture', 'specialty',
+                                'experience', 'bonus_doctor')}),
+    )
+    # без роли ролевые представления не пускают пользователя никуда
+    add_fieldsets = UserAdmin.add_fieldsets + (
+        ('Профиль', {'classes': ('wide',), 'fields': ('fio', 'role')}),
+    )
+
+
+@admin.register(Department)
+class DepartmentAdmin(admin.ModelAdmin):
+    list_display = ('department_name', 'doctor', 'floor', 'cabinet')
+    list_select_related = ('doctor',)
+    search_fields = ('department_name',)
+    raw_id_fields = ('doctor',)
+
+
+@admin.register(Service)
+class ServiceAdmin(admin.ModelAdmin):
+    list_display = ('service_name', 'service_price', 'department')
+    list_select_related = ('department',)
+    search_fields = ('service_name',)
+    autocomplete_fields = ('department',)
+
+
+@admin.register(SlotBooking)
+class SlotBookingAdmin(LargeTableAdmin):
+    list_display = ('doctor', 'date', 'recording_time', 'patient')
+    list_select_related = ('doctor', 'recording_time', 'patient')
+    raw_id_fields = ('doctor', 'patient')
+
+
+@admin.register(DailyRevenue)
+class DailyRevenueAdmin(LargeTableAdmin):
+    list_display = ('date', 'doctor', 'department', 'service', 'visits', 'revenue')
+    list_select_related = ('doctor', 'department', 'service')
+    raw_id_fields = ('doctor', 'department', 'service')
+
 
-admin.site.register(Patient)
 admin.site.register(RecordingTime)
-admin.site.register(Service)
-admin.site.register(Department)
-admin.site.register(UserProfile)
 admin.site.register(Specialty)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SystemAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'system_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .metrics import install_serializer_timer
+        install_serializer_timer()
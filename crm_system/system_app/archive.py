@@ -0,0 +1,134 @@
+"""
+Архив пациентов. Записи старше PATIENT_ARCHIVE_AFTER_DAYS пачками переносятся в ArchivedPatient
+(вместе с историей болезни и слотами) и при необходимости возвращаются обратно с теми же id.
+Выручка в DailyRevenue при переносе не меняется — архивные визиты остаются в отчётах.
+Чтение заходит в архив, только если запрошенный диапазон дат захватывает архивные даты (covers).
+"""
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from . import search
+from .availability import booking_day
+from .models import (ArchivedMedicalRecord, ArchivedPatient, MedicalRecord, Patient, RecordingTime,
+                     SlotBooking)
+
+PATIENT_FIELDS = ('id', 'full_name', 'birthday', 'gender', 'phone_number', 'department_id', 'service_id',
+                  'doctor_id', 'reception_id', 'type_record', 'created_date')
+RECORD_FIELDS = ('patient_id', 'version', 'author_id', 'compression', 'content', 'created_date')
+
+# при переносе удаление из горячей таблицы не должно вычитать выручку и слать события очереди
+archiving = ContextVar('archiving', default=False)
+
+
+def cutoff(days=None):
+    return timezone.now() - timedelta(days=settings.PATIENT_ARCHIVE_AFTER_DAYS if days is None else days)
+
+
+def newest_archived():
+    """
+    Дата самой новой архивной записи. Не кэшируется: перенос идёт командой в другом процессе,
+    а чтение последней записи по индексу archived_created_idx дешевле риска потерять архив в выгрузке.
+    """
+    return ArchivedPatient.objects.order_by('-created_date').values_list('created_date', flat=True).first()
+
+
+def covers(since):
+    """Нужен ли архив для диапазона, начинающегося с since (None — с самого начала)."""
+    newest = newest_archived()
+    return newest is not None and (since is None or since <= newest)
+
+
+def copy(source, model, fields):
+    return model(**{name: getattr(source, name) for name in fields})
+
+
+def batches(queryset, batch_size):
+    while ids := list(queryset.order_by('created_date', 'id').values_list('id', flat=True)[:batch_size]):
+        yield ids
+
+
+def archive_batch(ids):
+    patients = list(Patient.objects.filter(id__in=ids).prefetch_related(
+        Prefetch('recording_time', queryset=RecordingTime.objects.only('id')),
+        Prefetch('slot_bookings', queryset=SlotBooking.objects.only('patient_id', 'date')),
+    ))
+    archived = []
+    for patient in patients:
+        row = copy(patient, ArchivedPatient, PATIENT_FIELDS)
+        row.recording_time_ids = [slot.id for slot in patient.recording_time.all()]
+        row.booked_date = next((booking.date for booking in patient.slot_bookings.all()), None)
+        archived.append(row)
+    ArchivedPatient.objects.bulk_create(archived)
+    ArchivedMedicalRecord.objects.bulk_create(
+        copy(record, ArchivedMedicalRecord, RECORD_FIELDS)
+        for record in MedicalRecord.objects.filter(patient_id__in=ids).iterator())
+    token = archiving.set(True)
+    try:
+        Patient.objects.filter(id__in=ids).delete()
+    finally:
+        archiving.reset(token)
+
+
+def restore_created_date(objects, sources):
+    """auto_now_add при вставке ставит текущее время — возвращаем исходные даты одним UPDATE."""
+    for obj, source in zip(objects, sources):
+        obj.created_date = source.created_date
+    if objects:
+        type(objects[0]).objects.bulk_update(objects, ['created_date'])
+
+
+def restore_batch(ids):
+    archived = list(ArchivedPatient.objects.filter(id__in=ids))
+    patients = Patient.objects.bulk_create([copy(row, Patient, PATIENT_FIELDS) for row in archived])
+    restore_created_date(patients, archived)
+    slots = set(RecordingTime.objects.filter(
+        id__in={slot_id for row in archived for slot_id in row.recording_time_ids}).values_list('id', flat=True))
+    through = Patient.recording_time.through
+    through.objects.bulk_create(through(patient_id=row.id, recordingtime_id=slot_id)
+                                for row in archived for slot_id in row.recording_time_ids if slot_id in slots)
+    SlotBooking.objects.bulk_create(
+        (SlotBooking(doctor_id=row.doctor_id, date=row.booked_date or booking_day(row), recording_time_id=slot_id,
+                     patient_id=row.id)
+         for row in archived if row.type_record != 'cencel' for slot_id in row.recording_time_ids if slot_id in slots),
+        ignore_conflicts=True)
+    archived_records = list(ArchivedMedicalRecord.objects.filter(patient_id__in=ids))
+    records = MedicalRecord.objects.bulk_create(copy(record, MedicalRecord, RECORD_FIELDS)
+                                                for record in archived_records)
+    restore_created_date(records, archived_records)
+    search.index_patients(patients)
+    ArchivedPatient.objects.filter(id__in=ids).delete()
+
+
+def archive_patients(before=None, batch_size=None, log=print):
+    """Переносит пациентов, записанных раньше before (по умолчанию — cutoff()), пачками по транзакции."""
+    before = before or cutoff()
+    batch_size = batch_size or settings.PATIENT_ARCHIVE_BATCH_SIZE
+    total = 0
+    for ids in batches(Patient.objects.filter(created_date__lt=before), batch_size):
+        with transaction.atomic():
+            archive_batch(ids)
+        total += len(ids)
+        log(f'в архиве: {total}')
+    return total
+
+
+def restore_patients(since=None, until=None, batch_size=None, log=print):
+    """Возвращает из архива пациентов, записанных в [since, until)."""
+    queryset = ArchivedPatient.objects.all()
+    if since:
+        queryset = queryset.filter(created_date__gte=since)
+    if until:
+        queryset = queryset.filter(created_date__lt=until)
+    batch_size = batch_size or settings.PATIENT_ARCHIVE_BATCH_SIZE
+    total = 0
+    for ids in batches(queryset, batch_size):
+        with transaction.atomic():
+            restore_batch(ids)
+        total += len(ids)
+        log(f'восстановлено: {total}')
+    return total
@@ -0,0 +1,188 @@
+"""
+Async-версии горячих GET-эндпоинтов для дашбордов врачей (работают под ASGI, см. crm_system/asgi.py).
+ORM вызывается асинхронно; соединения с БД открываются и закрываются штатно по request_started/finished,
+поэтому под ASGI держите CONN_MAX_AGE=0 (значение по умолчанию в settings) или пул (DB_POOL_MAX_SIZE).
+"""
+import asyncio
+import base64
+
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from users.authentication import ClaimsJWTAuthentication
+from .cache import ReferenceCacheMixin, areference_version
+from .events import format_sse, get_broker
+from .history import aattach_latest
+from .models import Department, Patient, Service
+from .pagination import PatientCursorPagination
+from .serializers import DepartmentSerializer, PatientDataForDoctorSerializer, ServiceListSerializer
+
+authenticator = ClaimsJWTAuthentication()
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=DjangoJSONEncoder,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def async_api_view(view):
+    """Аутентификация как у DRF-представлений: без заголовка — аноним, с неверным токеном — 401."""
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return json_response({'detail': f'Метод "{request.method}" не разрешён.'}, status=405)
+        try:
+            result = await authenticator.aauthenticate(request)
+        except (AuthenticationFailed, InvalidToken) as exc:
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return json_response(data, status=401)
+        if result is not None:
+            request.user, request.auth = result
+        try:
+            return await view(request, *args, **kwargs)
+        except Http404:
+            return json_response({'detail': 'Не найдено.'}, status=404)
+    return wrapper
+
+
+def encode_cursor(patient):
+    raw = f'{patient.created_date.isoformat()}|{patient.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(value):
+    try:
+        created, pk = base64.urlsafe_b64decode(value.encode()).decode().split('|')
+        created, pk = parse_datetime(created), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    # parse_datetime возвращает None для строки не в ISO-формате
+    return (created, pk) if created is not None else None
+
+
+def requested_fields(request, serializer_class):
+    param = request.GET.get('fields')
+    if not param:
+        return None
+    requested = {name.strip() for name in param.split(',')}
+    return [name for name in serializer_class.Meta.fields if name in requested] or None
+
+
+@async_api_view
+async def patient_data_for_doctor_list(request):
+    """Keyset-пагинация по (created_date, id) в том же порядке, что и синхронная версия."""
+    fields = requested_fields(request, PatientDataForDoctorSerializer)
+    queryset = Patient.objects.only('id', 'created_date', *PatientDataForDoctorSerializer.model_columns(fields))
+    cursor = decode_cursor(request.GET['cursor']) if 'cursor' in request.GET else None
+    if 'cursor' in request.GET and cursor is None:
+        return json_response({'detail': 'Неверный курсор.'}, status=404)
+    if cursor:
+        created, pk = cursor
+        queryset = queryset.filter(Q(created_date__lt=created) | Q(created_date=created, id__lt=pk))
+    page_size = PatientCursorPagination.page_size
+    patients = [p async for p in queryset.order_by('-created_date', '-id')[:page_size + 1]]
+    next_url = None
+    if len(patients) > page_size:
+        patients = patients[:page_size]
+        query = request.GET.copy()
+        query['cursor'] = encode_cursor(patients[-1])
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+    data = PatientDataForDoctorSerializer(patients, many=True, fields=fields).data
+    return json_response({'next': next_url, 'results': data})
+
+
+@async_api_view
+async def patient_data_for_doctor_detail(request, pk):
+    fields = requested_fields(request, PatientDataForDoctorSerializer)
+    queryset = Patient.objects.only('id', 'created_date', *PatientDataForDoctorSerializer.model_columns(fields))
+    patient = await queryset.filter(pk=pk).afirst()
+    if patient is None:
+        raise Http404
+    await aattach_latest(patient)
+    return json_response(PatientDataForDoctorSerializer(patient, fields=fields).data)
+
+
+async def reference_response(request, queryset, serializer_class):
+    """Тот же версионный кэш и ETag, что у ReferenceCacheMixin, но через async API кэша."""
+    version = await areference_version()
+    etag, last_modified = f'"{version}"', version // 10 ** 9
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if isinstance(not_modified, HttpResponseNotModified):
+        return not_modified
+    key = f'reference:{version}:async:{request.get_full_path()}'
+    data = await cache.aget(key)
+    if data is None:
+        data = serializer_class([obj async for obj in queryset], many=True).data
+        await cache.aset(key, data, ReferenceCacheMixin.cache_timeout)
+    response = json_response(data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+@async_api_view
+async def department_list(request):
+    queryset = Department.objects.select_related('doctor').prefetch_related('service_depart', 'doctor__specialty')
+    return await reference_response(request, queryset, DepartmentSerializer)
+
+
+@async_api_view
+async def service_list(request):
+    return await reference_response(request, Service.objects.select_related('department'), ServiceListSerializer)
+
+
+HEARTBEAT_SECONDS = 15
+
+
+async def event_stream(channel, last_id):
+    broker = get_broker()
+    with broker.subscribe(channel) as queue:
+        # подписка до replay, чтобы не потерять события между ними; дубли отсекаются по id
+        events, complete = broker.replay(channel, last_id) if last_id is not None else ([], True)
+        yield 'retry: 3000\n\n'
+        if not complete:
+            yield 'event: reset\ndata: {}\n\n'
+        for event in events:
+            last_id = event.id
+            yield format_sse(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if last_id is None or event.id > last_id:
+                last_id = event.id
+                yield format_sse(event)
+
+
+@async_api_view
+async def queue_events(request):
+    """
+    Живая очередь врача (?doctor=) или отделения (?department=): события created/updated/cancelled/deleted.
+    После переподключения клиент присылает Last-Event-ID (или ?last_event_id=) и получает пропущенное;
+    если история уже вытеснена, приходит событие reset — тогда нужна полная загрузка списка.
+    Только под ASGI: WSGI-обработчик дочитывает асинхронный поток до конца, а он бесконечный.
+    """
+    if not isinstance(request, ASGIRequest):
+        return json_response({'detail': 'Поток событий доступен только под ASGI.'}, status=501)
+    for kind in ('doctor', 'department'):
+        value = request.GET.get(kind)
+        if value:
+            break
+    else:
+        return json_response({'detail': 'Укажите doctor или department.'}, status=400)
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if not value.isdigit() or (last_id is not None and not last_id.isdigit()):
+        return json_response({'detail': 'Неверные параметры.'}, status=400)
+    stream = event_stream(f'{kind}:{value}', int(last_id) if last_id is not None else None)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,37 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import RecordingTime, SlotBooking
+
+
+def free_slots(doctor_id, day):
+    """Свободные слоты врача на день — один запрос по индексу (doctor, date, recording_time)."""
+    busy = SlotBooking.objects.filter(doctor_id=doctor_id, date=day).values('recording_time_id')
+    return RecordingTime.objects.exclude(id__in=busy).order_by('shift_start')
+
+
+def booking_day(patient):
+    return timezone.localdate(patient.created_date)
+
+
+def book_slots(patient, slots, day):
+    """Занимает слоты за пациентом; при занятом слоте откатывает транзакцию целиком."""
+    bookings = [SlotBooking(doctor_id=patient.doctor_id, date=day, recording_time=slot, patient=patient)
+                for slot in slots]
+    try:
+        with transaction.atomic():
+            SlotBooking.objects.bulk_create(bookings)
+    except IntegrityError:
+        raise serializers.ValidationError({'recording_time': 'Это время у врача уже занято.'})
+
+
+def release_slots(patient):
+    SlotBooking.objects.filter(patient=patient).delete()
+
+
+def rebook_slots(patient, slots):
+    day = patient.slot_bookings.values_list('date', flat=True).first() or booking_day(patient)
+    release_slots(patient)
+    if patient.type_record != 'cencel':
+        book_slots(patient, slots, day)
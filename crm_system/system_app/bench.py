@@ -0,0 +1,413 @@
+"""
+Синтетические данные и нагрузочный прогон API в процессе (django.test.Client).
+
+    python manage.py seed_clinic --patients 1000000
+    python manage.py bench_api --iterations 200 --output bench.json --baseline main.json
+    python manage.py bench_writes --patients 500 --concurrency 1 8 32
+    python manage.py bench_encoding --iterations 20
+
+Запускайте на отдельной базе: генератор пишет в ту БД, что настроена в DATABASES.
+"""
+import asyncio
+import gzip
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, time as dtime, timedelta
+from itertools import islice
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+from django.test import AsyncClient, Client
+from rest_framework.renderers import JSONRenderer
+from django.urls import reverse
+from django.utils import timezone
+
+from users.tokens import ClaimsRefreshToken
+
+from . import revenue, search
+from .cache import bump_reference_version
+from .middleware import QueryTimer, brotli
+from .renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+from .archive import restore_created_date
+from .models import (Department, MedicalRecord, Patient, RecordingTime, Service, SlotBooking, Specialty,
+                     UserProfile)
+
+BENCH_PASSWORD = 'bench-password'
+
+FIRST_NAMES = ['Айбек', 'Бакыт', 'Нурлан', 'Азамат', 'Айгуль', 'Жылдыз', 'Мария', 'Иван', 'Elena', 'John', 'Aida', 'Timur']
+LAST_NAMES = ['Асанов', 'Токтогулов', 'Иванов', 'Петрова', 'Абдыкадыров', 'Садыкова', 'Smith', 'Kim', 'Orozbaev', 'Li']
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def seed(departments=10, doctors_per_department=3, receptions=10, services_per_department=5,
+         patients=10000, days=365, batch_size=5000, rng_seed=1, log=print):
+    rng = random.Random(rng_seed)
+    run = UserProfile.objects.count()
+    password = make_password(BENCH_PASSWORD)
+
+    specialties = Specialty.objects.bulk_create(Specialty(specialty_name=f'Специальность {run}-{i}') for i in range(10))
+    doctors = UserProfile.objects.bulk_create(
+        UserProfile(username=f'bench_doctor_{run}_{i}', password=password, fio=f'Доктор {run}-{i}', role='doctor',
+                    bonus_doctor=rng.choice([5, 10, 15]), experience=rng.randint(1, 30))
+        for i in range(departments * doctors_per_department)
+    )
+    through = UserProfile.specialty.through
+    through.objects.bulk_create(through(userprofile_id=d.id, specialty_id=rng.choice(specialties).id) for d in doctors)
+    staff = UserProfile.objects.bulk_create(
+        UserProfile(username=f'bench_reception_{run}_{i}', password=password, fio=f'Регистратор {run}-{i}',
+                    role='reception')
+        for i in range(receptions)
+    )
+    depts = Department.objects.bulk_create(
+        Department(department_name=f'Отделение {run}-{i}', floor=i % 5 + 1, cabinet=100 + i,
+                   doctor=doctors[i * doctors_per_department])
+        for i in range(departments)
+    )
+    services = Service.objects.bulk_create(
+        Service(service_name=f'Услуга {d.id}-{j}', service_price=rng.randrange(300, 5000, 50), department=d)
+        for d in depts for j in range(services_per_department)
+    )
+    if not RecordingTime.objects.exists():
+        start = datetime.combine(timezone.localdate(), dtime(8, 0))
+        RecordingTime.objects.bulk_create(
+            RecordingTime(shift_start=(start + timedelta(minutes=30 * i)).time(),
+                          shift_end=(start + timedelta(minutes=30 * i + 30)).time())
+            for i in range(20)
+        )
+    slots = list(RecordingTime.objects.values_list('id', flat=True))
+    log(f'справочники: {len(depts)} отделений, {len(doctors)} врачей, {len(staff)} регистраторов')
+
+    doctors_by_department = {d.id: doctors[i * doctors_per_department:(i + 1) * doctors_per_department]
+                             for i, d in enumerate(depts)}
+    now = timezone.now()
+
+    def make_patient(i):
+        service = rng.choice(services)
+        return Patient(
+            full_name=f'{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}',
+            birthday=datetime(1940, 1, 1).date() + timedelta(days=rng.randrange(365 * 80)),
+            gender=rng.choice(['man', 'woman']),
+            phone_number=f'+996{rng.choice([555, 700, 770, 777])}{rng.randrange(10 ** 6):06d}',
+            department_id=service.department_id, service=service,
+            doctor=rng.choice(doctors_by_department[service.department_id]), reception=rng.choice(staff),
+            type_record=rng.choices(['queue', 'online', 'cencel'], weights=[6, 3, 1])[0],
+            created_date=now - timedelta(seconds=rng.randrange(days * 86400)),
+        )
+
+    created = 0
+    recording = Patient.recording_time.through
+    taken = set()
+
+    def free_slot(patient):
+        # живая очередь без слота, если у врача в этот день всё занято
+        day = timezone.localdate(patient.created_date)
+        for slot in rng.sample(slots, min(3, len(slots))):
+            if (patient.doctor_id, day, slot) not in taken:
+                taken.add((patient.doctor_id, day, slot))
+                return day, slot
+        return None
+
+    for batch in batched((make_patient(i) for i in range(patients)), batch_size):
+        planned = [SimpleNamespace(created_date=p.created_date) for p in batch]
+        with transaction.atomic():
+            # auto_now_add перезаписывает даты при вставке: возвращаем их одним UPDATE на пачку
+            restore_created_date(Patient.objects.bulk_create(batch), planned)
+            booked = [(p, free_slot(p)) for p in batch]
+            recording.objects.bulk_create(recording(patient_id=p.id, recordingtime_id=slot[1])
+                                          for p, slot in booked if slot)
+            SlotBooking.objects.bulk_create(
+                (SlotBooking(doctor_id=p.doctor_id, date=slot[0], recording_time_id=slot[1], patient_id=p.id)
+                 for p, slot in booked if slot and p.type_record != 'cencel'),
+                ignore_conflicts=True)
+            search.index_patients(batch)
+            records = [p for p in batch if rng.random() < 0.5]
+            restore_created_date(MedicalRecord.objects.bulk_create(
+                MedicalRecord(patient_id=p.id, version=1, author_id=p.doctor_id,
+                              text='Жалобы на головную боль. ' * rng.randint(1, 20))
+                for p in records), records)
+        created += len(batch)
+        log(f'пациенты: {created}/{patients}')
+    log(f'агрегаты выручки: {revenue.rebuild()}')
+    bump_reference_version()
+
+
+def patient_payload(ctx):
+    return reverse('patient_create'), {
+        'full_name': 'Бенчмарк Пациент', 'birthday': '1990-01-01', 'department': ctx['department'].id,
+        'service': ctx['service'].id, 'doctor': ctx['department'].doctor_id, 'reception': ctx['reception'].id,
+        'recording_time': [], 'type_record': 'queue',
+    }
+
+
+def bench_context():
+    reception = UserProfile.objects.filter(role='reception', username__startswith='bench_').first()
+    department = Department.objects.select_related('doctor').first()
+    if reception is None or department is None:
+        raise RuntimeError('Нет данных: сначала выполните manage.py seed_clinic')
+    return {'reception': reception, 'department': department, 'service': department.service_depart.first()}
+
+
+def scenarios():
+    """Эндпоинты прогона: (имя, метод, функция контекста -> (url, params/payload))."""
+    return [
+        ('department-list-list', 'get', lambda ctx: (reverse('department-list-list'), {})),
+        ('service_list', 'get', lambda ctx: (reverse('service_list'), {})),
+        ('recording_time-list-list', 'get', lambda ctx: (reverse('recording_time-list-list'), {})),
+        ('doctor_profile-list', 'get', lambda ctx: (reverse('doctor_profile-list'), {})),
+        ('patient_data', 'get', lambda ctx: (reverse('patient_data'), {})),
+        ('patient_data_for_doctor-list-list', 'get', lambda ctx: (reverse('patient_data_for_doctor-list-list'), {})),
+        ('patient_search', 'get', lambda ctx: (reverse('patient_search'), {'q': 'асан'})),
+        ('availability', 'get', lambda ctx: (reverse('availability'),
+                                             {'doctor': ctx['department'].doctor_id,
+                                              'date': timezone.localdate().isoformat()})),
+        ('revenue_report', 'get', lambda ctx: (reverse('revenue_report'), {'group_by': 'doctor'})),
+        ('patient_create', 'post', patient_payload),
+        ('login', 'post', lambda ctx: (reverse('login'), {'username': ctx['reception'].username,
+                                                          'password': BENCH_PASSWORD})),
+    ]
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def run(iterations=100, warmup=5, only=None, log=print):
+    ctx = bench_context()
+    token = str(ClaimsRefreshToken.for_user(ctx['reception']).access_token)
+    client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    results = {}
+    for name, method, build in scenarios():
+        if only and name not in only:
+            continue
+        url, data = build(ctx)
+        send = (lambda: client.get(url, data)) if method == 'get' else \
+            (lambda: client.post(url, data, content_type='application/json'))
+        for _ in range(warmup):
+            send()
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            timer = QueryTimer()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                start = time.perf_counter()
+                response = send()
+                latencies.append(time.perf_counter() - start)
+            queries.append(timer.count)
+            errors += response.status_code >= 400
+        elapsed = time.perf_counter() - started
+        ordered = sorted(latencies)
+        results[name] = {
+            'requests': iterations,
+            'errors': errors,
+            'throughput_rps': round(iterations / elapsed, 2),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+            'p50_ms': round(percentile(ordered, 0.5) * 1000, 3),
+            'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+            'queries': max(queries),
+        }
+        log(f'{name:40} {results[name]["throughput_rps"]:9.1f} rps  p95 {results[name]["p95_ms"]:8.2f} ms  '
+            f'{results[name]["queries"]:3} queries  {errors} errors')
+    return {
+        'meta': {
+            'timestamp': timezone.now().isoformat(),
+            'iterations': iterations,
+            'patients': Patient.objects.count(),
+            'doctors': UserProfile.objects.filter(role='doctor').count(),
+            'departments': Department.objects.count(),
+        },
+        'endpoints': results,
+    }
+
+
+# самые объёмные ответы API
+ENCODING_ENDPOINTS = ['department-list-list', 'service_list', 'doctor_profile-list', 'patient_data',
+                      'patient_data_for_doctor-list-list', 'bootstrap']
+
+
+def encoders():
+    """Доступные рендереры: стандартный DRF всегда, orjson и MessagePack — если пакеты установлены."""
+    available = {'drf-json': JSONRenderer()}
+    if orjson is not None:
+        available['orjson'] = ORJSONRenderer()
+    if msgpack is not None:
+        available['msgpack'] = MessagePackRenderer()
+    return available
+
+
+def wire_sizes(body):
+    sizes = {'identity': len(body), 'gzip': len(gzip.compress(body, compresslevel=6))}
+    if brotli is not None:
+        sizes['br'] = len(brotli.compress(body, quality=getattr(settings, 'BROTLI_QUALITY', 5)))
+    return sizes
+
+
+def encoding_costs(iterations=20, only=None, log=print):
+    """Время кодирования данных ответа каждым рендерером и размер тела без сжатия, в gzip и brotli."""
+    ctx = bench_context()
+    token = str(ClaimsRefreshToken.for_user(ctx['reception']).access_token)
+    client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+    results = {}
+    for name in ENCODING_ENDPOINTS:
+        if only and name not in only:
+            continue
+        response = client.get(reverse(name))
+        if response.status_code != 200:
+            raise RuntimeError(f'{name}: HTTP {response.status_code}')
+        data = response.data
+        results[name] = {}
+        for fmt, renderer in encoders().items():
+            body = renderer.render(data)
+            start = time.perf_counter()
+            for _ in range(iterations):
+                renderer.render(data)
+            row = {'encode_ms': round((time.perf_counter() - start) / iterations * 1000, 3), **wire_sizes(body)}
+            results[name][fmt] = row
+            log(f'{name:36} {fmt:9} {row["encode_ms"]:9.3f} ms  ' +
+                '  '.join(f'{encoding} {size} B' for encoding, size in row.items() if encoding != 'encode_ms'))
+    return {
+        'meta': {'timestamp': timezone.now().isoformat(), 'iterations': iterations,
+                 'patients': Patient.objects.count(), 'doctors': UserProfile.objects.filter(role='doctor').count()},
+        'endpoints': results,
+    }
+
+
+def compare(current, baseline, tolerance=0.2):
+    """Регрессии относительно прошлого прогона: p95 хуже на tolerance, больше SQL, новые ошибки."""
+    problems = []
+    for name, old in baseline.get('endpoints', {}).items():
+        new = current['endpoints'].get(name)
+        if new is None:
+            continue
+        if new['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            problems.append(f'{name}: p95 {old["p95_ms"]} -> {new["p95_ms"]} ms')
+        if new['queries'] > old['queries']:
+            problems.append(f'{name}: queries {old["queries"]} -> {new["queries"]}')
+        if new['errors'] > old['errors']:
+            problems.append(f'{name}: errors {old["errors"]} -> {new["errors"]}')
+    return problems
+
+
+def login_throughput(logins=20, log=print):
+    """Проверок пароля в секунду на одном ядре: «до» — стандартный PBKDF2 Django, «после» — хешер из settings."""
+    password = 'shift-change-42'
+    profiles = {
+        'before': hashers.PBKDF2PasswordHasher(),
+        'after': hashers.get_hasher('default'),
+    }
+    results = {}
+    for name, hasher in profiles.items():
+        encoded = hasher.encode(password, hasher.salt())
+        start = time.perf_counter()
+        for _ in range(logins):
+            hasher.verify(password, encoded)
+        single = logins / (time.perf_counter() - start)
+        results[name] = {
+            'hasher': encoded.split('$', 2)[0] + '$' + encoded.split('$')[1],
+            'logins_per_sec_per_core': round(single, 2),
+        }
+        log(f'{name:7} {results[name]["hasher"]:28} {single:8.1f}/s на ядро')
+    return results
+
+
+ASYNC_PAIRS = [
+    ('patient_data_for_doctor', 'patient_data_for_doctor-list-list', 'async_patient_data_for_doctor_list'),
+    ('department', 'department-list-list', 'async_department_list'),
+    ('service', 'service_list', 'async_service_list'),
+]
+
+
+def concurrency_throughput(requests=200, concurrency=20, log=print):
+    """
+    Пропускная способность при concurrency одновременных запросах: WSGI-путь (DRF, пул потоков)
+    против ASGI-пути (async-представления, asyncio.gather) в одном процессе.
+    """
+    reception = UserProfile.objects.filter(role='reception').first()
+    headers = {}
+    if reception is not None:
+        headers['Authorization'] = f'Bearer {ClaimsRefreshToken.for_user(reception).access_token}'
+
+    def wsgi_run(url):
+        client = Client(headers=headers)
+
+        def one(_):
+            return client.get(url).status_code
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = time.perf_counter()
+            codes = list(pool.map(one, range(requests)))
+        return time.perf_counter() - start, codes
+
+    async def asgi_run(url):
+        client = AsyncClient(headers=headers)
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with limit:
+                return (await client.get(url)).status_code
+        start = time.perf_counter()
+        codes = await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - start, codes
+
+    results = {}
+    for name, sync_name, async_name in ASYNC_PAIRS:
+        row = {}
+        for mode, elapsed_codes in (('wsgi', wsgi_run(reverse(sync_name))),
+                                    ('asgi', asyncio.run(asgi_run(reverse(async_name))))):
+            elapsed, codes = elapsed_codes
+            row[mode] = {'throughput_rps': round(requests / elapsed, 2),
+                         'errors': sum(code >= 400 for code in codes)}
+        results[name] = row
+        log(f'{name:25} WSGI {row["wsgi"]["throughput_rps"]:9.1f} rps   ASGI {row["asgi"]["throughput_rps"]:9.1f} rps')
+    return {'requests': requests, 'concurrency': concurrency, 'endpoints': results}
+
+
+def write_throughput(patients=200, levels=(1, 4, 8, 16), log=print):
+    """
+    Параллельная запись пациентов через POST /system/patient/create/ на текущей БД:
+    сколько записей в секунду проходит при разном числе одновременных регистраторов и сколько падает
+    (на SQLite без WAL/IMMEDIATE это "database is locked").
+    """
+    ctx = bench_context()
+    url, payload = patient_payload(ctx)
+    headers = {'Authorization': f'Bearer {ClaimsRefreshToken.for_user(ctx["reception"]).access_token}'}
+    connection = connections['default']
+    backend = {'vendor': connection.vendor}
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            backend['journal_mode'] = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+    else:
+        backend['pool'] = bool(connection.settings_dict['OPTIONS'].get('pool'))
+        backend['conn_max_age'] = connection.settings_dict['CONN_MAX_AGE']
+
+    def one(_):
+        client = Client(headers=headers, raise_request_exception=False)
+        try:
+            return client.post(url, payload, content_type='application/json').status_code
+        finally:
+            connections.close_all()
+
+    results = {}
+    for level in levels:
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            start = time.perf_counter()
+            codes = list(pool.map(one, range(patients)))
+            elapsed = time.perf_counter() - start
+        results[level] = {'throughput_rps': round(patients / elapsed, 2),
+                          'errors': sum(code >= 400 for code in codes)}
+        log(f'{connection.vendor:10} x{level:<3} {results[level]["throughput_rps"]:9.1f} writes/s  '
+            f'{results[level]["errors"]} errors')
+    return {'backend': backend, 'patients': patients, 'concurrency': results}
@@ -0,0 +1,88 @@
+"""
+Стартовые данные интерфейса регистратуры одним ответом (/system/bootstrap/): справочники,
+врачи и сегодняшняя очередь. Набор запросов фиксирован и не зависит от числа строк.
+Справочники кэшируются по версии справочников, роли и адресу сайта (в ссылках на фото врачей
+абсолютный URL с хостом запроса), очередь — по версии очереди и дате.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from users.serializers import DoctorProfileSerializer, SpecialtySerializer
+from .cache import queue_version, reference_version
+from .exports import day_start
+from .models import Department, Patient, RecordingTime, Service, SlotBooking, Specialty, UserProfile
+from .serializers import DepartmentSerializer, QueuePatientSerializer, RecordingTimeSerializer, ServiceListSerializer
+
+# поля врача, которые видит только администратор
+ADMIN_ONLY_DOCTOR_FIELDS = ('bonus_doctor',)
+
+
+def reference_data(role, context):
+    doctors = DoctorProfileSerializer(
+        UserProfile.objects.filter(role='doctor').prefetch_related('specialty'), many=True, context=context).data
+    if role != 'admin':
+        for doctor in doctors:
+            for name in ADMIN_ONLY_DOCTOR_FIELDS:
+                doctor.pop(name, None)
+    return {
+        'departments': DepartmentSerializer(
+            Department.objects.select_related('doctor').prefetch_related('service_depart', 'doctor__specialty'),
+            many=True, context=context).data,
+        'services': ServiceListSerializer(Service.objects.select_related('department'), many=True).data,
+        'recording_times': RecordingTimeSerializer(RecordingTime.objects.all(), many=True).data,
+        'doctors': doctors,
+        'specialties': SpecialtySerializer(Specialty.objects.all(), many=True).data,
+    }
+
+
+def today_queue(day):
+    """
+    Записанные на сегодня (SlotBooking.date — день приёма, а не день записи) и живая очередь,
+    пришедшая сегодня без брони слота; отменённые не показываются.
+    """
+    booked_today = SlotBooking.objects.filter(date=day).values('patient_id')
+    has_booking = SlotBooking.objects.filter(patient=OuterRef('pk'))
+    # диапазон по created_date вместо __date, чтобы работал индекс patient_created_idx
+    walk_in = (Q(created_date__gte=day_start(day), created_date__lt=day_start(day + timedelta(days=1)))
+               & ~Exists(has_booking))
+    patients = (Patient.objects
+                .filter(Q(id__in=booked_today) | walk_in)
+                .exclude(type_record='cencel')
+                .prefetch_related('recording_time')
+                .order_by('created_date', 'id'))
+    return QueuePatientSerializer(patients, many=True).data
+
+
+def cached(key, build):
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, getattr(settings, 'REFERENCE_CACHE_TIMEOUT', 60 * 60 * 24))
+    return data
+
+
+class Snapshot:
+    """Версии, под которыми собирается ответ: одни и те же для ETag и для ключей кэша."""
+    def __init__(self, role, origin):
+        self.role = role
+        self.origin = origin
+        self.reference = reference_version()
+        self.queue = queue_version()
+        self.day = timezone.localdate()
+
+    @property
+    def etag(self):
+        key = f'{self.role}:{self.origin}:{self.reference}:{self.queue}:{self.day.isoformat()}'
+        return '"%s"' % hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+    def data(self, context):
+        data = dict(cached(f'bootstrap:{self.reference}:{self.role}:{self.origin}',
+                           lambda: reference_data(self.role, context)))
+        data['queue'] = cached(f'bootstrap:queue:{self.queue}:{self.day.isoformat()}', lambda: today_queue(self.day))
+        data['date'] = self.day
+        return data
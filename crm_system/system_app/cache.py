@@ -0,0 +1,94 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+VERSION_KEY = 'reference:version'
+QUEUE_VERSION_KEY = 'queue:version'
+
+
+def current_version(key):
+    """
+    Версия набора данных — метка времени последнего изменения.
+    Если ключ вытеснен из кэша, создаётся новая версия, и старые записи просто перестают читаться.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def reference_version():
+    # справочники: отделения, услуги, специальности, слоты, врачи
+    return current_version(VERSION_KEY)
+
+
+def queue_version():
+    # пациенты текущей очереди (снимок в /system/bootstrap/)
+    return current_version(QUEUE_VERSION_KEY)
+
+
+async def areference_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        await cache.aadd(VERSION_KEY, version, None)
+        version = await cache.aget(VERSION_KEY, version)
+    return version
+
+
+def bump_reference_version():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def bump_queue_version():
+    cache.set(QUEUE_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_reference_cache():
+    # повторно после коммита: иначе параллельный запрос может закэшировать старые данные под новой версией
+    bump_reference_version()
+    transaction.on_commit(bump_reference_version)
+
+
+def invalidate_queue_cache():
+    bump_queue_version()
+    transaction.on_commit(bump_queue_version)
+
+
+class ReferenceCacheMixin:
+    """Кэширует list/retrieve справочников по версии и отдаёт ETag/Last-Modified для ответа 304."""
+    cache_timeout = getattr(settings, 'REFERENCE_CACHE_TIMEOUT', 60 * 60 * 24)
+
+    def cached_response(self, request, build):
+        version = reference_version()
+        etag = f'"{version}"'
+        last_modified = version // 10 ** 9
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            patch_vary_headers(not_modified, ['Accept'])
+            return not_modified
+        # с хостом: ссылки на фото врачей в ответе абсолютные
+        key = f'reference:{version}:{request.build_absolute_uri()}'
+        data = cache.get(key)
+        if data is None:
+            data = build().data
+            cache.set(key, data, self.cache_timeout)
+        response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # ETag один на все форматы (JSON, MessagePack): кэши должны различать их по Accept
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(ReferenceCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(ReferenceCacheMixin, self).retrieve(request, *args, **kwargs))
@@ -0,0 +1,106 @@
+"""
+События живой очереди для push-канала (/system/events/, Server-Sent Events).
+
+Брокер по умолчанию живёт в памяти процесса: публикация и подписчики должны быть в одном
+ASGI-процессе. Для нескольких процессов укажите в QUEUE_EVENTS_BROKER класс с тем же интерфейсом
+(publish / replay / subscribe) поверх внешнего брокера.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict, deque, namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+Event = namedtuple('Event', 'id type data')
+
+
+class InMemoryBroker:
+    def __init__(self, buffer_size=1000):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history = defaultdict(lambda: deque(maxlen=buffer_size))
+        self._dropped = defaultdict(int)
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, event_type, data):
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, event_type, data)
+            history = self._history[channel]
+            if len(history) == history.maxlen:
+                self._dropped[channel] = history[0].id
+            history.append(event)
+            subscribers = list(self._subscribers[channel])
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        return event
+
+    def replay(self, channel, last_id):
+        """События после last_id и признак, что история полная (иначе клиенту нужна полная перезагрузка)."""
+        with self._lock:
+            complete = self._dropped[channel] <= last_id <= self._seq
+            return [event for event in self._history[channel] if event.id > last_id], complete
+
+    @contextmanager
+    def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        broker_class = import_string(getattr(settings, 'QUEUE_EVENTS_BROKER', 'system_app.events.InMemoryBroker'))
+        _broker = broker_class(getattr(settings, 'QUEUE_EVENTS_BUFFER', 1000))
+    return _broker
+
+
+def patient_payload(patient):
+    return {
+        'id': patient.id,
+        'full_name': patient.full_name,
+        'type_record': patient.type_record,
+        'doctor': patient.doctor_id,
+        'department': patient.department_id,
+        'service': patient.service_id,
+        'created_date': patient.created_date.isoformat() if patient.created_date else None,
+    }
+
+
+def channels(patient):
+    return [f'doctor:{patient.doctor_id}', f'department:{patient.department_id}']
+
+
+def publish_patient(event_type, patient, before=None):
+    """
+    Публикует событие в каналы врача и отделения (и в старые, если запись перенесли) после коммита.
+    Данные снимаются сразу: после delete() у объекта уже нет id.
+    """
+    data = patient_payload(patient)
+    targets = channels(patient)
+    if before is not None:
+        targets += [channel for channel in channels(before) if channel not in targets]
+
+    def publish():
+        broker = get_broker()
+        for channel in targets:
+            broker.publish(channel, event_type, data)
+
+    transaction.on_commit(publish)
+
+
+def format_sse(event):
+    return f'id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data, ensure_ascii=False)}\n\n'
@@ -0,0 +1,81 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from . import archive
+from .models import ArchivedPatient, Patient
+
+CHUNK_SIZE = 2000
+
+COLUMNS = [
+    ('id', lambda p: p.id),
+    ('full_name', lambda p: p.full_name),
+    ('birthday', lambda p: p.birthday.isoformat()),
+    ('gender', lambda p: p.gender or ''),
+    ('phone_number', lambda p: str(p.phone_number or '')),
+    ('type_record', lambda p: p.type_record),
+    ('created_date', lambda p: timezone.localtime(p.created_date).strftime("%d-%m-%Y %H:%M")),
+    ('department', lambda p: p.department.department_name),
+    ('service', lambda p: p.service.service_name),
+    ('service_price', lambda p: p.service.service_price),
+    ('doctor', lambda p: p.doctor.fio),
+]
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_queryset(date_from=None, date_to=None, department=None, model=Patient):
+    """Пациенты для выгрузки; фильтр по дате строится диапазоном, чтобы работал индекс по created_date."""
+    queryset = (model.objects
+                .select_related('department', 'service', 'doctor')
+                .only('id', 'full_name', 'birthday', 'gender', 'phone_number', 'type_record', 'created_date',
+                      'department__department_name', 'service__service_name', 'service__service_price',
+                      'doctor__fio')
+                .order_by('created_date', 'id'))
+    if date_from:
+        queryset = queryset.filter(created_date__gte=day_start(date_from))
+    if date_to:
+        queryset = queryset.filter(created_date__lt=day_start(date_to + timedelta(days=1)))
+    if department:
+        queryset = queryset.filter(department=department)
+    return queryset
+
+
+def export_querysets(date_from=None, date_to=None, department=None):
+    """Архив (он старше) идёт первым и читается, только если диапазон захватывает архивные даты."""
+    querysets = [export_queryset(date_from, date_to, department)]
+    if archive.covers(day_start(date_from) if date_from else None):
+        querysets.insert(0, export_queryset(date_from, date_to, department, model=ArchivedPatient))
+    return querysets
+
+
+def iter_patients(querysets):
+    for queryset in querysets:
+        yield from queryset.iterator(chunk_size=CHUNK_SIZE)
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def iter_csv(querysets):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in COLUMNS])
+    for patient in iter_patients(querysets):
+        yield writer.writerow([getter(patient) for _, getter in COLUMNS])
+
+
+def iter_ndjson(querysets):
+    for patient in iter_patients(querysets):
+        yield json.dumps({name: getter(patient) for name, getter in COLUMNS}, ensure_ascii=False) + '\n'
+
+
+FORMATS = {
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson; charset=utf-8'),
+}
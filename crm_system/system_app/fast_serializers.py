@@ -0,0 +1,136 @@
+"""
+Быстрый режим списков только для чтения. Из обычного сериализатора один раз на запрос строится
+схема: какие колонки читать через ``values_list`` и чем преобразовать каждую. Дальше строки
+собираются в словари без объектов моделей; простые поля приводятся встроенными str/int.
+Вывод совпадает с обычным сериализатором (см. FastListParityTests).
+"""
+from collections import defaultdict
+from types import SimpleNamespace
+
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+from .metrics import timed_serialization
+
+# to_representation, которые для значений из БД сводятся к встроенному приведению типа
+PLAIN_CONVERTERS = {
+    serializers.CharField.to_representation: str,
+    serializers.IntegerField.to_representation: int,
+}
+
+
+def converter(field):
+    plain = PLAIN_CONVERTERS.get(type(field).to_representation)
+    if plain is not None:
+        return plain
+    if isinstance(field, serializers.FileField):
+        # из values_list приходит имя файла: оборачиваем в FieldFile, чтобы получить тот же url
+        model_field = field.parent.Meta.model._meta.get_field(field.source)
+        return lambda name: field.to_representation(model_field.attr_class(None, model_field, name))
+    return field.to_representation
+
+
+class ValuesSerializer:
+    """Собирает список словарей из ``queryset.values_list(..., named=True)`` по полям сериализатора."""
+
+    def __init__(self, serializer):
+        self.columns = []
+        self.many = []
+        self.model = serializer.Meta.model
+        self.build = self.compile(serializer, '')
+
+    def column(self, name):
+        if name not in self.columns:
+            self.columns.append(name)
+        return self.columns.index(name)
+
+    def require(self, *names):
+        """Колонки, нужные не выводу, а, например, курсору пагинации."""
+        for name in names:
+            self.column(name)
+
+    def compile(self, serializer, prefix):
+        steps = []
+        method_columns = getattr(serializer, 'values_columns', {})
+        for name, field in serializer.fields.items():
+            if field.write_only or getattr(field, 'skip_in_lists', False):
+                continue
+            source = prefix + field.source.replace('.', '__')
+            if isinstance(field, serializers.SerializerMethodField):
+                indexes = {column: self.column(prefix + column) for column in method_columns[name]}
+                steps.append((name, 'method', indexes, field.to_representation))
+            elif isinstance(field, serializers.ListSerializer):
+                raise TypeError(f'{name}: вложенные списки не поддерживаются')
+            elif isinstance(field, serializers.BaseSerializer):
+                steps.append((name, 'nested', self.column(source), self.compile(field, source + '__')))
+            elif isinstance(field, ManyRelatedField):
+                if prefix or not isinstance(field.child_relation, PrimaryKeyRelatedField):
+                    raise TypeError(f'{name}: поддерживаются только списки первичных ключей верхнего уровня')
+                self.many.append((name, source))
+                steps.append((name, 'many', self.column('pk'), None))
+            elif isinstance(field, PrimaryKeyRelatedField):
+                steps.append((name, 'value', self.column(source), None))
+            elif isinstance(field, serializers.Field) and field.source != '*':
+                steps.append((name, 'value', self.column(source), converter(field)))
+            else:
+                raise TypeError(f'{name}: поле {type(field).__name__} не поддерживается')
+
+        def build(row, related):
+            item = {}
+            for name, kind, index, extra in steps:
+                if kind == 'value':
+                    value = row[index]
+                    item[name] = value if value is None or extra is None else extra(value)
+                elif kind == 'nested':
+                    item[name] = None if row[index] is None else extra(row, related)
+                elif kind == 'many':
+                    item[name] = related[name].get(row[index], [])
+                else:
+                    item[name] = extra(SimpleNamespace(**{column: row[i] for column, i in index.items()}))
+            return item
+        return build
+
+    def queryset(self, queryset):
+        return queryset.prefetch_related(None).values_list(*self.columns, named=True)
+
+    def related(self, rows):
+        related = {}
+        if not self.many:
+            return related
+        pks = [row[self.columns.index('pk')] for row in rows]
+        for name, source in self.many:
+            model_field = self.model._meta.get_field(source)
+            through = model_field.remote_field.through
+            own, other = model_field.m2m_field_name(), model_field.m2m_reverse_field_name()
+            # порядок как у instance.<m2m>.all(): по порядку добавления связей
+            pairs = through.objects.filter(**{f'{own}_id__in': pks}).order_by('pk').values_list(
+                f'{own}_id', f'{other}_id')
+            related[name] = grouped = defaultdict(list)
+            for pk, value in pairs:
+                grouped[pk].append(value)
+        return related
+
+    def to_representation(self, rows):
+        with timed_serialization():
+            rows = list(rows)
+            related = self.related(rows)
+            build = self.build
+            return [build(row, related) for row in rows]
+
+
+class FastListMixin:
+    """list() через ValuesSerializer; FAST_LIST_SERIALIZERS = False возвращает обычные сериализаторы."""
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'FAST_LIST_SERIALIZERS', True):
+            return super().list(request, *args, **kwargs)
+        values = ValuesSerializer(self.get_serializer())
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        values.require(*(name.lstrip('-') for name in ([ordering] if isinstance(ordering, str) else ordering)))
+        queryset = values.queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values.to_representation(page))
+        return Response(values.to_representation(queryset))
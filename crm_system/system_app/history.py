@@ -0,0 +1,37 @@
+"""
+История болезни: версии в MedicalRecord вместо колонки Patient.medical_history.
+Списки пациентов её не читают; карточка пациента подгружает последнюю версию, полная история —
+постранично через /system/patient_data_for_doctor/<id>/history/.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from .models import MedicalRecord
+
+
+def append(patient, text, author=None):
+    """Добавляет новую версию; при гонке двух врачей повторяет попытку со следующим номером."""
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                last = patient.medical_records.aggregate(last=Max('version'))['last'] or 0
+                return MedicalRecord.objects.create(patient=patient, version=last + 1, author=author, text=text)
+        except IntegrityError:
+            continue
+    raise IntegrityError('Не удалось записать версию истории болезни.')
+
+
+def latest_queryset(patient_id):
+    return MedicalRecord.objects.filter(patient_id=patient_id).only('content', 'compression').order_by('-version')
+
+
+def attach_latest(patient):
+    record = latest_queryset(patient.pk).first()
+    patient.latest_medical_history = record.text if record else None
+    return patient
+
+
+async def aattach_latest(patient):
+    record = await latest_queryset(patient.pk).afirst()
+    patient.latest_medical_history = record.text if record else None
+    return patient
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from system_app.archive import archive_patients, cutoff
+
+
+class Command(BaseCommand):
+    help = 'Переносит старых пациентов в архив пачками (для запуска по расписанию, например из cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='старше скольких дней; по умолчанию PATIENT_ARCHIVE_AFTER_DAYS')
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        total = archive_patients(cutoff(options['days']), options['batch_size'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'Перенесено в архив: {total}'))
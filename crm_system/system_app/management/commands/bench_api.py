@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from system_app.bench import compare, run
+
+
+class Command(BaseCommand):
+    help = 'Прогон основных эндпоинтов: rps, p50/p95/p99 и число SQL; сравнение с прошлым JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--only', nargs='*', help='имена URL, например patient_data service_list')
+        parser.add_argument('--output', '-o', help='куда сохранить результаты JSON')
+        parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='допустимый рост p95 (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        try:
+            results = run(iterations=options['iterations'], warmup=options['warmup'], only=options['only'],
+                          log=self.stdout.write)
+        except RuntimeError as exc:
+            raise CommandError(exc)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                problems = compare(results, json.load(f), options['tolerance'])
+            if problems:
+                raise CommandError('Регрессия производительности:\n' + '\n'.join(problems))
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
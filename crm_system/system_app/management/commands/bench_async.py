@@ -0,0 +1,20 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from system_app.bench import concurrency_throughput
+
+
+class Command(BaseCommand):
+    help = 'Сравнение пропускной способности async (ASGI) и sync (WSGI) версий эндпоинтов чтения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--output', '-o', help='куда сохранить результаты JSON')
+
+    def handle(self, *args, **options):
+        results = concurrency_throughput(options['requests'], options['concurrency'], log=self.stdout.write)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,23 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from system_app.bench import ENCODING_ENDPOINTS, encoding_costs
+
+
+class Command(BaseCommand):
+    help = 'Время кодирования ответа (DRF JSON / orjson / MessagePack) и размер тела без сжатия, в gzip и brotli'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--only', nargs='*', choices=ENCODING_ENDPOINTS)
+        parser.add_argument('--output', '-o', help='куда сохранить результаты JSON')
+
+    def handle(self, *args, **options):
+        try:
+            results = encoding_costs(options['iterations'], options['only'], log=self.stdout.write)
+        except RuntimeError as exc:
+            raise CommandError(exc)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,19 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from system_app.bench import login_throughput
+
+
+class Command(BaseCommand):
+    help = 'Входов в секунду на ядро: стандартный PBKDF2 против настроенного хешера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help='проверок пароля на ядро')
+        parser.add_argument('--output', '-o', help='куда сохранить результаты JSON')
+
+    def handle(self, *args, **options):
+        results = login_throughput(options['logins'], log=self.stdout.write)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,20 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from system_app.bench import write_throughput
+
+
+class Command(BaseCommand):
+    help = 'Пропускная способность параллельной записи пациентов на настроенной БД (SQLite/PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=200, help='записей на каждый уровень параллельности')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+        parser.add_argument('--output', '-o', help='куда сохранить результаты JSON')
+
+    def handle(self, *args, **options):
+        results = write_throughput(options['patients'], options['concurrency'], log=self.stdout.write)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
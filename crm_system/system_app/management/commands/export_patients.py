@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from system_app.exports import FORMATS, export_querysets
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка пациентов в CSV или NDJSON без загрузки всей таблицы в память'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=parse_date, help='YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=parse_date, help='YYYY-MM-DD')
+        parser.add_argument('--department', type=int)
+        parser.add_argument('--format', dest='file_format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='файл; по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        querysets = export_querysets(options['date_from'], options['date_to'], options['department'])
+        rows = FORMATS[options['file_format']][0](querysets)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+                out.writelines(rows)
+        else:
+            for chunk in rows:
+                self.stdout.write(chunk, ending='')
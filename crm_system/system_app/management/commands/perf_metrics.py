@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from system_app.metrics import summarize
+
+
+class Command(BaseCommand):
+    help = 'Перцентили времени, SQL и размера ответа по эндпоинтам (из общего кэша воркеров)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=['wall', 'queries', 'sql', 'serialize', 'bytes', 'count'], default='wall')
+
+    def handle(self, *args, **options):
+        summary = summarize()
+        if not summary:
+            self.stdout.write('Нет данных: метрики пишутся в кэш воркерами, нужен общий CACHE_BACKEND.')
+            return
+        key = options['sort']
+        rows = sorted(summary.items(), reverse=True,
+                      key=lambda item: item[1]['count'] if key == 'count' else item[1][key][0.95])
+        self.stdout.write(f'{"view":40} {"count":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+                          f'{"sql p95":>7} {"sql ms":>8} {"serial":>8} {"render":>8} {"bytes":>9}')
+        for view, item in rows:
+            self.stdout.write(
+                f'{view[:40]:40} {item["count"]:7} '
+                f'{item["wall"][0.5] * 1000:8.1f} {item["wall"][0.95] * 1000:8.1f} {item["wall"][0.99] * 1000:8.1f} '
+                f'{item["queries"][0.95]:7.0f} {item["sql"][0.95] * 1000:8.1f} {item["serialize"][0.95] * 1000:8.1f} '
+                f'{item["render"][0.95] * 1000:8.1f} {item["bytes"][0.95]:9.0f}'
+            )
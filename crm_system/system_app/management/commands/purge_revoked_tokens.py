@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from users.revocation import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истёкшие отозванные токены и старые строки token_blacklist пачками (запускать по расписанию)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--pause', type=float, default=0.0, help='пауза между пачками, секунд')
+
+    def handle(self, *args, **options):
+        totals = purge_expired(options['batch_size'], options['pause'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено: отозванных {totals["revoked"]}, token_blacklist {totals["outstanding"]}'))
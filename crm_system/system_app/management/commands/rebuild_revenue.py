@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from system_app.revenue import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные агрегаты выручки с нуля по таблице пациентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        total = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано агрегатов: {total}'))
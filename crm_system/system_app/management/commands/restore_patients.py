@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from system_app.archive import restore_patients
+from system_app.exports import day_start
+
+
+class Command(BaseCommand):
+    help = 'Возвращает пациентов из архива за период (даты записи, включительно)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=parse_date, help='YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=parse_date, help='YYYY-MM-DD')
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        since = day_start(options['date_from']) if options['date_from'] else None
+        until = day_start(options['date_to'] + timedelta(days=1)) if options['date_to'] else None
+        total = restore_patients(since, until, options['batch_size'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'Восстановлено из архива: {total}'))
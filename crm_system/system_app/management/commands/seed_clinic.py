@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from system_app.bench import seed
+
+
+class Command(BaseCommand):
+    help = 'Заполняет БД синтетическими отделениями, услугами, врачами и пациентами для бенчмарков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', type=int, default=10)
+        parser.add_argument('--doctors-per-department', type=int, default=3)
+        parser.add_argument('--receptions', type=int, default=10)
+        parser.add_argument('--services-per-department', type=int, default=5)
+        parser.add_argument('--patients', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=365, help='глубина истории записей')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        seed(departments=options['departments'], doctors_per_department=options['doctors_per_department'],
+             receptions=options['receptions'], services_per_department=options['services_per_department'],
+             patients=options['patients'], days=options['days'], batch_size=options['batch_size'],
+             rng_seed=options['seed'], log=self.stdout.write)
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+FIELDS = ('wall', 'queries', 'sql', 'serialize', 'render', 'bytes')
+QUANTILES = (0.5, 0.95, 0.99)
+WORKERS_KEY = 'perf:workers'
+
+
+def metrics_setting(name, default):
+    return getattr(settings, f'PERF_METRICS_{name}', default)
+
+
+# [секунды, идёт ли замер] текущего запроса; None — вне замеряемого запроса
+serialize_timer = ContextVar('serialize_timer', default=None)
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Время построения данных ответа (serializer.data, быстрые списки); вложенные вызовы не суммируются.
+    Если queryset вычисляется внутри сериализатора, сюда входит и его SQL (он же учтён в sql).
+    """
+    timer = serialize_timer.get()
+    if timer is None or timer[1]:
+        yield
+        return
+    timer[1] = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer[0] += time.perf_counter() - start
+        timer[1] = False
+
+
+def install_serializer_timer():
+    """Оборачивает BaseSerializer.data: через него проходят Serializer.data и ListSerializer.data."""
+    from rest_framework.serializers import BaseSerializer
+    original = BaseSerializer.data.fget
+    if getattr(original, 'timed', False):
+        return
+
+    def data(self):
+        with timed_serialization():
+            return original(self)
+    data.timed = True
+    BaseSerializer.data = property(data)
+
+
+class MetricsStore:
+    """
+    Метрики запросов по имени URL: окно последних N замеров на эндпоинт плюс общий счётчик.
+    Раз в FLUSH_SECONDS снимок воркера кладётся в кэш, чтобы /metrics и команда видели все процессы.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=metrics_setting('RESERVOIR', 1000)))
+        self._counts = defaultdict(int)
+        self._last_flush = time.monotonic()
+
+    def record(self, view, sample):
+        with self._lock:
+            self._samples[view].append(sample)
+            self._counts[view] += 1
+            due = time.monotonic() - self._last_flush >= metrics_setting('FLUSH_SECONDS', 10)
+            if due:
+                self._last_flush = time.monotonic()
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {view: {'count': self._counts[view], 'samples': list(samples)}
+                    for view, samples in self._samples.items()}
+
+    def flush(self):
+        key = f'perf:worker:{os.getpid()}'
+        timeout = metrics_setting('FLUSH_SECONDS', 10) * 30
+        cache.set(key, self.snapshot(), timeout)
+        workers = cache.get(WORKERS_KEY, set())
+        if key not in workers:
+            cache.set(WORKERS_KEY, workers | {key}, None)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+store = MetricsStore()
+
+
+def merged_snapshot():
+    """Снимки всех воркеров из кэша; свой процесс — всегда свежий, из памяти."""
+    own = f'perf:worker:{os.getpid()}'
+    snapshots = [store.snapshot()]
+    workers = cache.get(WORKERS_KEY, set())
+    snapshots += [snapshot for key, snapshot in cache.get_many([key for key in workers if key != own]).items()]
+    merged = defaultdict(lambda: {'count': 0, 'samples': []})
+    for snapshot in snapshots:
+        for view, data in snapshot.items():
+            merged[view]['count'] += data['count']
+            merged[view]['samples'] += data['samples']
+    return dict(merged)
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def summarize(snapshot=None):
+    summary = {}
+    for view, data in sorted((snapshot if snapshot is not None else merged_snapshot()).items()):
+        if not data['samples']:
+            continue
+        columns = list(zip(*data['samples']))
+        item = {'count': data['count']}
+        for name, values in zip(FIELDS, columns):
+            ordered = sorted(values)
+            item[name] = {q: percentile(ordered, q) for q in QUANTILES}
+            item[name]['sum'] = sum(values)
+        summary[view] = item
+    return summary
+
+
+PROMETHEUS_METRICS = (
+    ('wall', 'crm_request_duration_seconds', 'Время обработки запроса'),
+    ('queries', 'crm_request_sql_queries', 'Число SQL-запросов на запрос'),
+    ('sql', 'crm_request_sql_seconds', 'Суммарное время SQL на запрос'),
+    ('serialize', 'crm_request_serialize_seconds', 'Время сериализаторов (serializer.data) на запрос'),
+    ('render', 'crm_request_render_seconds', 'Время сериализации ответа в байты'),
+    ('bytes', 'crm_response_size_bytes', 'Размер тела ответа'),
+)
+
+
+def render_prometheus(summary):
+    lines = []
+    for field, metric, help_text in PROMETHEUS_METRICS:
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} summary']
+        for view, item in summary.items():
+            label = view.replace('\\', '\\\\').replace('"', '\\"')
+            for q in QUANTILES:
+                lines.append(f'{metric}{{view="{label}",quantile="{q}"}} {item[field][q]:.6g}')
+            lines.append(f'{metric}_sum{{view="{label}"}} {item[field]["sum"]:.6g}')
+            lines.append(f'{metric}_count{{view="{label}"}} {item["count"]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,173 @@
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+from . import routers
+from .metrics import serialize_timer, store
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_br = _lazy_re_compile(r'\bbr\b')
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет время запроса, число и время SQL, время сериализаторов (metrics.timed_serialization),
+    время рендера DRF-ответа в байты и размер тела и складывает их в ``metrics.store`` по имени URL (``patient_create``, ``department-list-list``...).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PERF_METRICS_ENABLED', True)
+        self.sample_rate = getattr(settings, 'PERF_METRICS_SAMPLE_RATE', 1.0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def record(self, request, response, wall, timer, serialize):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        store.record(view, (wall, timer.count, timer.seconds, serialize[0], request._perf_render_seconds, size))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        timer = QueryTimer()
+        request._perf_render_seconds = 0.0
+        serialize = [0.0, False]
+        token = serialize_timer.set(serialize)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            serialize_timer.reset(token)
+        self.record(request, response, time.perf_counter() - start, timer, serialize)
+        return response
+
+    async def __acall__(self, request):
+        # под ASGI ORM выполняется в отдельном потоке со своими соединениями,
+        # поэтому SQL здесь не считается — только время и размер ответа
+        if not self.sampled():
+            return await self.get_response(request)
+        request._perf_render_seconds = 0.0
+        serialize = [0.0, False]
+        token = serialize_timer.set(serialize)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            serialize_timer.reset(token)
+        self.record(request, response, time.perf_counter() - start, QueryTimer(), serialize)
+        return response
+
+    def process_template_response(self, request, response):
+        if hasattr(request, '_perf_render_seconds'):
+            start = time.perf_counter()
+
+            def rendered(response):
+                request._perf_render_seconds = time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Разрешает чтение с реплик на время безопасного запроса; после записи держит клиента на primary."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def begin(self, request):
+        if not routers.replicas():
+            return None, None
+        key = routers.client_key(request)
+        safe = request.method in routers.SAFE_METHODS
+        return key, routers.use_replica.set(safe and not routers.is_sticky(key))
+
+    def end(self, request, key, token):
+        if token is None:
+            return
+        routers.use_replica.reset(token)
+        if request.method not in routers.SAFE_METHODS and key is not None:
+            routers.stick_to_primary(key)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key, token = self.begin(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self.end(request, key, token)
+
+    async def __acall__(self, request):
+        key, token = self.begin(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            self.end(request, key, token)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Сжатие ответов: brotli, если клиент его принимает и пакет brotli установлен, иначе gzip.
+    Потоковые ответы (выгрузки) сжимаются gzip по мере отдачи; SSE не сжимается, чтобы события не копились.
+    """
+    min_length = 200
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        if (brotli is None or response.streaming or response.has_header('Content-Encoding')
+                or len(response.content) < self.min_length
+                or not re_accepts_br.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))):
+            return super().process_response(request, response)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=getattr(settings, 'BROTLI_QUALITY', 5))
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_bookings(apps, schema_editor):
+    Patient = apps.get_model('system_app', 'Patient')
+    SlotBooking = apps.get_model('system_app', 'SlotBooking')
+    db = schema_editor.connection.alias
+    bookings = []
+    patients = Patient.objects.using(db).exclude(type_record='cencel').prefetch_related('recording_time')
+    for patient in patients.iterator(chunk_size=2000):
+        day = timezone.localdate(patient.created_date)
+        for slot in patient.recording_time.all():
+            bookings.append(SlotBooking(doctor_id=patient.doctor_id, date=day,
+                                        recording_time_id=slot.id, patient_id=patient.id))
+    SlotBooking.objects.using(db).bulk_create(bookings, batch_size=2000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_bookings', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_bookings', to='system_app.patient')),
+                ('recording_time', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_bookings', to='system_app.recordingtime')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'date', 'recording_time'), name='unique_doctor_slot')],
+            },
+        ),
+        migrations.RunPython(backfill_bookings, migrations.RunPython.noop),
+    ]
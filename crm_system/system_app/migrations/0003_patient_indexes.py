@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_app', '0002_slotbooking'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='role',
+            field=models.CharField(choices=[('doctor', 'doctor'), ('reception', 'reception'), ('admin', 'admin')], db_index=True, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['doctor', 'created_date'], name='patient_doctor_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['department', 'type_record', 'created_date'], name='patient_dep_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['created_date', 'id'], name='patient_created_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_app', '0003_patient_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('visits', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='system_app.department')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='system_app.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['doctor', 'date'], name='revenue_doctor_date_idx'), models.Index(fields=['department', 'date'], name='revenue_department_date_idx'), models.Index(fields=['service', 'date'], name='revenue_service_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'doctor', 'department', 'service'), name='unique_daily_revenue')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+# копия нормализации system_app.search на момент миграции: миграция не должна меняться вместе с кодом
+def normalize_name(value):
+    return ' '.join((value or '').lower().replace('ё', 'е').split())
+
+
+def phone_digits(value):
+    return re.sub(r'\D', '', str(value or ''))
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS system_app_patient_search "
+        "USING fts5(name, phone, tokenize='trigram')"
+    )
+    # заполнение в Python: lower() SQLite не понижает кириллицу и не заменяет ё на е
+    Patient = apps.get_model('system_app', 'Patient')
+    patients = (Patient.objects.using(schema_editor.connection.alias)
+                .values_list('id', 'full_name', 'phone_number').iterator(chunk_size=BATCH_SIZE))
+    with schema_editor.connection.cursor() as cursor:
+        batch = []
+        for patient_id, full_name, phone_number in patients:
+            batch.append((patient_id, normalize_name(full_name), phone_digits(phone_number)))
+            if len(batch) == BATCH_SIZE:
+                cursor.executemany('INSERT INTO system_app_patient_search (rowid, name, phone) VALUES (%s, %s, %s)',
+                                   batch)
+                batch = []
+        if batch:
+            cursor.executemany('INSERT INTO system_app_patient_search (rowid, name, phone) VALUES (%s, %s, %s)',
+                               batch)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS system_app_patient_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_app', '0004_dailyrevenue'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:41
+
+import zlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_medical_history(apps, schema_editor):
+    """Текущий текст medical_history становится версией 1 (автор неизвестен)."""
+    Patient = apps.get_model('system_app', 'Patient')
+    MedicalRecord = apps.get_model('system_app', 'MedicalRecord')
+    # дата записи = дата визита; у исторической модели auto_now_add можно отключить
+    MedicalRecord._meta.get_field('created_date').auto_now_add = False
+    db = schema_editor.connection.alias
+    threshold = getattr(settings, 'MEDICAL_HISTORY_COMPRESS_MIN_BYTES', 512)
+    patients = Patient.objects.using(db).exclude(medical_history__isnull=True).exclude(medical_history='')
+    batch = []
+    for patient_id, created, text in patients.values_list('id', 'created_date', 'medical_history').iterator(2000):
+        content = text.encode()
+        compressed = threshold is not None and len(content) >= threshold
+        batch.append(MedicalRecord(patient_id=patient_id, version=1, created_date=created,
+                                   content=zlib.compress(content) if compressed else content,
+                                   compression='zlib' if compressed else ''))
+        if len(batch) >= 2000:
+            MedicalRecord.objects.using(db).bulk_create(batch)
+            batch = []
+    MedicalRecord.objects.using(db).bulk_create(batch)
+
+
+def restore_medical_history(apps, schema_editor):
+    Patient = apps.get_model('system_app', 'Patient')
+    MedicalRecord = apps.get_model('system_app', 'MedicalRecord')
+    db = schema_editor.connection.alias
+    for record in MedicalRecord.objects.using(db).order_by('patient_id', '-version').iterator(2000):
+        content = bytes(record.content)
+        text = (zlib.decompress(content) if record.compression == 'zlib' else content).decode()
+        Patient.objects.using(db).filter(pk=record.patient_id, medical_history__isnull=True).update(
+            medical_history=text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_app', '0007_profile_picture_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('compression', models.CharField(blank=True, choices=[('', 'нет'), ('zlib', 'zlib')], default='', max_length=8)),
+                ('content', models.BinaryField()),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='medical_records', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='medical_records', to='system_app.patient')),
+            ],
+            options={
+                'ordering': ['-version'],
+                'constraints': [models.UniqueConstraint(fields=('patient', 'version'), name='unique_patient_history_version')],
+            },
+        ),
+        migrations.RunPython(move_medical_history, restore_medical_history),
+        migrations.RemoveField(
+            model_name='patient',
+            name='medical_history',
+        ),
+    ]
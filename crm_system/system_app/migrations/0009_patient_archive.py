@@ -0,0 +1,58 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:45
+
+import django.db.models.deletion
+import phonenumber_field.modelfields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_app', '0008_medical_records'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPatient',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('full_name', models.CharField(max_length=100)),
+                ('birthday', models.DateField()),
+                ('gender', models.CharField(blank=True, choices=[('man', 'man'), ('woman', 'woman')], max_length=16, null=True)),
+                ('phone_number', phonenumber_field.modelfields.PhoneNumberField(blank=True, max_length=128, null=True, region='KG')),
+                ('recording_time_ids', models.JSONField(blank=True, default=list)),
+                ('booked_date', models.DateField(blank=True, null=True)),
+                ('type_record', models.CharField(choices=[('online', 'онлайн запись'), ('queue', 'живая очередь'), ('cencel', 'отмена')], default='queue', max_length=32)),
+                ('created_date', models.DateTimeField()),
+                ('archived_date', models.DateTimeField(auto_now_add=True)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_patients', to='system_app.department')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_patient_doctor', to=settings.AUTH_USER_MODEL)),
+                ('reception', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_patient_reception', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_patients', to='system_app.service')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedMedicalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('compression', models.CharField(blank=True, choices=[('', 'нет'), ('zlib', 'zlib')], default='', max_length=8)),
+                ('content', models.BinaryField()),
+                ('created_date', models.DateTimeField()),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_medical_records', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='medical_records', to='system_app.archivedpatient')),
+            ],
+            options={
+                'ordering': ['-version'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedpatient',
+            index=models.Index(fields=['created_date', 'id'], name='archived_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpatient',
+            index=models.Index(fields=['doctor', 'created_date'], name='archived_doctor_created_idx'),
+        ),
+    ]
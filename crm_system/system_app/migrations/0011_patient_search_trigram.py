@@ -0,0 +1,35 @@
+from django.db import migrations
+
+# выражения совпадают с SQL поиска вне SQLite (system_app.search.fallback_ids):
+# full_name__icontains -> UPPER(full_name::text) LIKE, phone_number__contains -> phone_number::text LIKE
+INDEXES = (
+    ('patient_full_name_trgm', 'UPPER(full_name::text)'),
+    ('patient_phone_trgm', '(phone_number::text)'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, expression in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON system_app_patient USING gin ({expression} gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_app', '0010_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
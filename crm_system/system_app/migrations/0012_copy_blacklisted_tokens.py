@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.utils import timezone
+
+BATCH_SIZE = 2000
+
+
+def copy_blacklisted_tokens(apps, schema_editor):
+    """
+    Переносит неистёкшие отзывы из token_blacklist в RevokedToken: ClaimsRefreshToken проверяет
+    только новую таблицу, и без переноса отозванные до обновления refresh-токены снова стали бы валидны.
+    """
+    BlacklistedToken = apps.get_model('token_blacklist', 'BlacklistedToken')
+    RevokedToken = apps.get_model('system_app', 'RevokedToken')
+    alias = schema_editor.connection.alias
+    rows = (BlacklistedToken.objects.using(alias).filter(token__expires_at__gt=timezone.now())
+            .values_list('token__jti', 'token__expires_at').iterator(chunk_size=BATCH_SIZE))
+    batch = []
+    for jti, expires_at in rows:
+        batch.append(RevokedToken(jti=jti, expires_at=expires_at))
+        if len(batch) == BATCH_SIZE:
+            RevokedToken.objects.using(alias).bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        RevokedToken.objects.using(alias).bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_app', '0011_patient_search_trigram'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_blacklisted_tokens, migrations.RunPython.noop),
+    ]
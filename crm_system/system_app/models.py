@@ -1,7 +1,11 @@
+import zlib
+
+from django.conf import settings
 from django.db import models
 from phonenumber_field.modelfields import PhoneNumberField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.auth.models import AbstractUser
+from .thumbnails import original_path
 
 
 class Specialty(models.Model):
@@ -11,6 +15,13 @@ class Specialty(models.Model):
         return f'{self.specialty_name}'
 
 
+def profile_picture_path(instance, filename):
+    # одинаковые файлы ложатся по одному пути (sha256 считается в pre_save)
+    if instance.profile_picture_hash:
+        return original_path(instance.profile_picture_hash, filename)
+    return f'profiles/{filename}'
+
+
 class UserProfile(AbstractUser):
     ROLE_CHOICES = (
         ('doctor', 'doctor'),
@@ -18,9 +29,11 @@ class UserProfile(AbstractUser):
         ('admin', 'admin')
     )
     fio = models.CharField(max_length=256)
-    role = models.CharField(max_length=64, choices=ROLE_CHOICES)
+    role = models.CharField(max_length=64, choices=ROLE_CHOICES, db_index=True)
     phone_number = PhoneNumberField(null=True, blank=True, region='KG', unique=True)
-    profile_picture = models.ImageField(upload_to='profiles/', null=True, blank=True)
+    profile_picture = models.ImageField(upload_to=profile_picture_path, null=True, blank=True)
+    profile_picture_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    profile_picture_processed = models.BooleanField(default=False, editable=False)
     age = models.PositiveSmallIntegerField(validators=[
         MinValueValidator(18),
         MaxValueValidator(110)
@@ -29,6 +42,10 @@ class UserProfile(AbstractUser):
     specialty = models.ManyToManyField(Specialty, related_name='specialty_doctor')
     bonus_doctor = models.PositiveSmallIntegerField(null=True, blank=True)
     created_date = models.DateField(auto_now_add=True)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+
+    # изменение этих полей делает устаревшими claims в уже выданных JWT
+    TOKEN_CLAIM_FIELDS = ('username', 'role', 'fio', 'password', 'is_active', 'is_staff', 'is_superuser')
 
     def __str__(self):
         return f'{self.fio} -- {self.role}'
@@ -82,8 +99,156 @@ class Patient(models.Model):
         ('cencel', 'отмена')
     )
     type_record = models.CharField(max_length=32, choices=TYPE_CHOICES, default='queue')
-    medical_history = models.TextField(null=True, blank=True)
     created_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["doctor", "created_date"], name="patient_doctor_created_idx"),
+            models.Index(fields=["department", "type_record", "created_date"], name="patient_dep_type_created_idx"),
+            models.Index(fields=["created_date", "id"], name="patient_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.full_name} - {self.get_type_record_display()}"
+
+
+class MedicalRecord(models.Model):
+    """
+    Версия истории болезни пациента. Записи только добавляются (system_app.history.append);
+    длинный текст хранится сжатым zlib, см. MEDICAL_HISTORY_COMPRESS_MIN_BYTES.
+    """
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="medical_records")
+    version = models.PositiveIntegerField()
+    author = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name="medical_records")
+    COMPRESSION_CHOICES = (
+        ('', 'нет'),
+        ('zlib', 'zlib'),
+    )
+    compression = models.CharField(max_length=8, choices=COMPRESSION_CHOICES, blank=True, default='')
+    content = models.BinaryField()
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-version"]
+        constraints = [
+            models.UniqueConstraint(fields=["patient", "version"], name="unique_patient_history_version"),
+        ]
+
+    @property
+    def text(self):
+        content = bytes(self.content)
+        if self.compression == 'zlib':
+            content = zlib.decompress(content)
+        return content.decode()
+
+    @text.setter
+    def text(self, value):
+        content = value.encode()
+        threshold = getattr(settings, 'MEDICAL_HISTORY_COMPRESS_MIN_BYTES', 512)
+        if threshold is not None and len(content) >= threshold:
+            self.content, self.compression = zlib.compress(content), 'zlib'
+        else:
+            self.content, self.compression = content, ''
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Запись истории болезни не изменяется — добавьте новую версию.')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.patient_id} v{self.version}"
+
+
+class ArchivedPatient(models.Model):
+    """Пациент, перенесённый из горячей таблицы в архив (system_app.archive); id сохраняется."""
+    id = models.BigIntegerField(primary_key=True)
+    full_name = models.CharField(max_length=100)
+    birthday = models.DateField()
+    gender = models.CharField(max_length=16, choices=Patient.GENDER_CHOICES, null=True, blank=True)
+    phone_number = PhoneNumberField(region='KG', null=True, blank=True)
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name="archived_patients")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="archived_patients")
+    doctor = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="archived_patient_doctor")
+    reception = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="archived_patient_reception")
+    recording_time_ids = models.JSONField(default=list, blank=True)
+    booked_date = models.DateField(null=True, blank=True)
+    type_record = models.CharField(max_length=32, choices=Patient.TYPE_CHOICES, default='queue')
+    created_date = models.DateTimeField()
+    archived_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_date", "id"], name="archived_created_idx"),
+            models.Index(fields=["doctor", "created_date"], name="archived_doctor_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.full_name} - {self.created_date:%d-%m-%Y} (архив)"
+
+
+class ArchivedMedicalRecord(models.Model):
+    """Версия истории болезни архивного пациента, копия MedicalRecord."""
+    patient = models.ForeignKey(ArchivedPatient, on_delete=models.CASCADE, related_name="medical_records")
+    version = models.PositiveIntegerField()
+    author = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name="archived_medical_records")
+    compression = models.CharField(max_length=8, choices=MedicalRecord.COMPRESSION_CHOICES, blank=True, default='')
+    content = models.BinaryField()
+    created_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-version"]
+
+    def __str__(self):
+        return f"{self.patient_id} v{self.version} (архив)"
+
+
+class SlotBooking(models.Model):
+    """Занятость слота врача на конкретный день: одна строка на (врач, день, слот)."""
+    doctor = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="slot_bookings")
+    date = models.DateField()
+    recording_time = models.ForeignKey(RecordingTime, on_delete=models.CASCADE, related_name="slot_bookings")
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="slot_bookings")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["doctor", "date", "recording_time"], name="unique_doctor_slot"),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id} - {self.date} - {self.recording_time}"
+
+
+
+class DailyRevenue(models.Model):
+    """Дневной агрегат по (врач, отделение, услуга): число визитов и выручка без отменённых записей."""
+    date = models.DateField()
+    doctor = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="daily_revenue")
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name="daily_revenue")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="daily_revenue")
+    visits = models.IntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "doctor", "department", "service"], name="unique_daily_revenue"),
+        ]
+        indexes = [
+            models.Index(fields=["doctor", "date"], name="revenue_doctor_date_idx"),
+            models.Index(fields=["department", "date"], name="revenue_department_date_idx"),
+            models.Index(fields=["service", "date"], name="revenue_service_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.doctor_id} - {self.service_id}: {self.revenue}"
+
+
+class RevokedToken(models.Model):
+    """Отозванный refresh-токен: хранится только до истечения самого токена (users.revocation)."""
+    jti = models.CharField(max_length=64, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
     def __str__(self):
-        return f"{self.full_name} - {self.recording_time} - {self.type_record}"
\ No newline at end of file
+        return f"{self.jti} до {self.expires_at:%d-%m-%Y %H:%M}"
@@ -0,0 +1,65 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class PatientCursorPagination(CursorPagination):
+    page_size = 50
+    ordering = ('-created_date', '-id')
+
+
+class MedicalRecordCursorPagination(CursorPagination):
+    page_size = 20
+    ordering = '-version'
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator админки для больших таблиц: без фильтров число строк берётся из оценки СУБД
+    (pg_class.reltuples в PostgreSQL, max(id) в SQLite). С фильтрами COUNT считает до exact_limit строк;
+    если их больше — оценка планировщика (EXPLAIN) в PostgreSQL, точный COUNT в остальных СУБД,
+    чтобы последние страницы оставались доступны.
+    """
+    exact_limit = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self.estimate(queryset)
+            if estimate is not None and estimate > self.exact_limit:
+                return estimate
+        count = queryset.order_by()[:self.exact_limit + 1].count()
+        if count <= self.exact_limit:
+            return count
+        estimate = self.planner_estimate(queryset)
+        if estimate is not None:
+            return max(estimate, count)
+        return queryset.count()
+
+    def planner_estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return row[0]
+        return queryset.model._default_manager.using(queryset.db).aggregate(last=Max('pk'))['last']
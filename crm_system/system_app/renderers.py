@@ -0,0 +1,64 @@
+"""
+Быстрые форматы ответа. orjson, msgpack и brotli необязательны: без orjson рендерер и парсер
+работают как стандартные DRF, MessagePack подключается в settings, только если установлен msgpack.
+Все три ставятся из req-fast.txt.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# даты, Decimal, ленивые строки — так же, как в стандартном JSONRenderer
+encode_default = JSONEncoder().default
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson; отступы (?indent, Accept: ...; indent=4) и отсутствие orjson — через DRF."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        # OPT_PASSTHROUGH_DATETIME: формат дат как у DRF (миллисекунды, «Z»), а не родной orjson
+        ret = orjson.dumps(data, default=encode_default,
+                           option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        # как DRF: U+2028/U+2029 допустимы в JSON, но не в JavaScript (JSONP, встраивание в <script>)
+        return ret.replace(LINE_SEPARATOR, b'\\u2028').replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Ответ в MessagePack по ``Accept: application/msgpack``; значения те же, что в JSON."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
@@ -0,0 +1,129 @@
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedPatient, DailyRevenue, Patient
+
+# ключей в одном OR-фильтре: дерево выражения SQLite ограничено глубиной 1000
+KEY_CHUNK_SIZE = 500
+
+
+def contribution(patient):
+    """Ключ агрегата и вклад пациента в него; отменённые записи в выручку не входят."""
+    if patient is None or patient.type_record == 'cencel':
+        return None
+    key = (timezone.localdate(patient.created_date), patient.doctor_id, patient.department_id, patient.service_id)
+    return key, patient.service.service_price
+
+
+def collect(patients, sign=1):
+    visits, revenue = Counter(), Counter()
+    for patient in patients:
+        item = contribution(patient)
+        if item:
+            key, price = item
+            visits[key] += sign
+            revenue[key] += sign * price
+    return visits, revenue
+
+
+def key_filter(keys):
+    condition = Q()
+    for day, doctor_id, department_id, service_id in keys:
+        condition |= Q(date=day, doctor_id=doctor_id, department_id=department_id, service_id=service_id)
+    return condition
+
+
+def apply(visits, revenue):
+    """
+    Применяет дельты пачкой: недостающие агрегаты вставляются нулевыми (конфликты игнорируются),
+    затем все нужные строки читаются под блокировкой (по KEY_CHUNK_SIZE ключей за запрос)
+    и сохраняются одним bulk_update — три запроса на каждые 500 различных (день, врач, отделение, услуга).
+    """
+    keys = [key for key in set(visits) | set(revenue) if visits[key] or revenue[key]]
+    if not keys:
+        return
+    with transaction.atomic():
+        DailyRevenue.objects.bulk_create([
+            DailyRevenue(date=day, doctor_id=doctor_id, department_id=department_id, service_id=service_id)
+            for day, doctor_id, department_id, service_id in keys
+        ], ignore_conflicts=True)
+        rows = []
+        for start in range(0, len(keys), KEY_CHUNK_SIZE):
+            chunk = keys[start:start + KEY_CHUNK_SIZE]
+            rows += DailyRevenue.objects.select_for_update().filter(key_filter(chunk))
+        for row in rows:
+            key = (row.date, row.doctor_id, row.department_id, row.service_id)
+            row.visits += visits[key]
+            row.revenue += revenue[key]
+        DailyRevenue.objects.bulk_update(rows, ['visits', 'revenue'])
+
+
+def record(patients):
+    apply(*collect(patients))
+
+
+def replace(before, after):
+    """Переносит вклад пациента со старого состояния (до сохранения) на новое."""
+    visits, revenue = collect([before], sign=-1)
+    added_visits, added_revenue = collect([after])
+    visits.update(added_visits)
+    revenue.update(added_revenue)
+    apply(visits, revenue)
+
+
+def aggregate_rows(model):
+    return (model.objects.exclude(type_record='cencel')
+            .annotate(day=TruncDate('created_date', tzinfo=timezone.get_current_timezone()))
+            .values('day', 'doctor_id', 'department_id', 'service_id')
+            .annotate(visits=Count('id'), revenue=Sum('service__service_price'))
+            .order_by())
+
+
+def rebuild(batch_size=2000):
+    """Пересчёт по горячей таблице и архиву: день на границе архивации может быть в обеих."""
+    visits, revenue = Counter(), Counter()
+    for model in (ArchivedPatient, Patient):
+        for row in aggregate_rows(model).iterator(chunk_size=batch_size):
+            key = (row['day'], row['doctor_id'], row['department_id'], row['service_id'])
+            visits[key] += row['visits']
+            revenue[key] += row['revenue'] or 0
+    aggregates = (DailyRevenue(date=day, doctor_id=doctor_id, department_id=department_id, service_id=service_id,
+                               visits=visits[day, doctor_id, department_id, service_id],
+                               revenue=revenue[day, doctor_id, department_id, service_id])
+                  for day, doctor_id, department_id, service_id in visits)
+    total = 0
+    with transaction.atomic():
+        DailyRevenue.objects.all().delete()
+        while batch := list(islice(aggregates, batch_size)):
+            DailyRevenue.objects.bulk_create(batch)
+            total += len(batch)
+    return total
+
+
+REPORT_GROUPS = {
+    'doctor': ('doctor_id', 'doctor__fio', 'doctor__bonus_doctor'),
+    'department': ('department_id', 'department__department_name'),
+    'service': ('service_id', 'service__service_name'),
+    'day': ('date',),
+}
+
+
+def report(group_by, date_from=None, date_to=None):
+    """Отчёт читает только дневные агрегаты: ~30 строк на врача за месяц."""
+    queryset = DailyRevenue.objects.all()
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    columns = REPORT_GROUPS[group_by]
+    rows = list(queryset.values(*columns).annotate(visits=Sum('visits'), revenue=Sum('revenue')).order_by(columns[0]))
+    if group_by == 'doctor':
+        # bonus_doctor — процент от выручки врача
+        for row in rows:
+            row['bonus'] = row['revenue'] * (row['doctor__bonus_doctor'] or 0) // 100
+    return rows
@@ -0,0 +1,60 @@
+"""
+Чтение с реплик. ``ReplicaRoutingMiddleware`` помечает безопасные запросы (GET/HEAD/OPTIONS),
+и на время такого запроса чтения моделей из ``REPLICA_APP_LABELS`` уходят на одну из
+``DATABASE_REPLICAS``. Запись, чтение вне запроса и запросы пользователя в течение
+``REPLICA_STICKY_SECONDS`` после его записи идут в ``default`` — так он видит свои изменения.
+"""
+import hashlib
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+use_replica = ContextVar('use_replica', default=False)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def client_key(request):
+    """Ключ «липкого» окна: id пользователя из JWT (общий для всех его входов) или хеш сессионной куки."""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header.startswith('Bearer '):
+        try:
+            return f'user:{AccessToken(header[7:])["user_id"]}'
+        except (TokenError, KeyError):
+            return None
+    session = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session:
+        return f'session:{hashlib.sha256(session.encode()).hexdigest()[:32]}'
+    return None
+
+
+def stick_to_primary(key):
+    cache.set(f'db:sticky:{key}', 1, getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+
+def is_sticky(key):
+    return key is not None and cache.get(f'db:sticky:{key}') is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and model._meta.app_label in getattr(settings, 'REPLICA_APP_LABELS', ()):
+            aliases = replicas()
+            if aliases:
+                return random.choice(aliases)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии default, объекты из них можно связывать между собой
+        return True
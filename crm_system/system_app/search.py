@@ -0,0 +1,95 @@
+import re
+
+from django.db import connection
+
+from .models import Patient
+
+TABLE = 'system_app_patient_search'
+MIN_TRIGRAM = 3
+
+
+def uses_fts():
+    return connection.vendor == 'sqlite'
+
+
+def normalize_name(value):
+    return ' '.join((value or '').lower().replace('ё', 'е').split())
+
+
+def phone_digits(value):
+    return re.sub(r'\D', '', str(value or ''))
+
+
+def index_patients(patients):
+    if not uses_fts():
+        return
+    rows = [(p.id, normalize_name(p.full_name), phone_digits(p.phone_number)) for p in patients]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {TABLE} (rowid, name, phone) VALUES (%s, %s, %s)', rows)
+
+
+def remove_patient(patient_id):
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [patient_id])
+
+
+def split_query(query):
+    """Делит запрос на части имени и цифры телефона: «Иванов 0700 12» -> (['иванов'], ['070012'])."""
+    names, digits = [], []
+    for term in normalize_name(query).split():
+        if phone_digits(term) and not re.sub(r'[\d+\-()]', '', term):
+            digits.append(phone_digits(term))
+        else:
+            names.append(term)
+    digits = ''.join(digits)
+    # местный формат 0700 123 456 хранится как +996 700 123 456
+    digits = digits[1:] if digits.startswith('0') else digits
+    return names, [digits] if digits else []
+
+
+def fts_ids(names, digits, limit):
+    match, like, params = [], [], []
+    for column, terms in (('name', names), ('phone', digits)):
+        for term in terms:
+            if len(term) >= MIN_TRIGRAM:
+                match.append(f'{column} : "{term.replace(chr(34), chr(34) * 2)}"')
+            else:
+                like.append(f'{column} LIKE %s')
+                params.append(f'%{term}%')
+    where = list(like)
+    if match:
+        where.insert(0, f'{TABLE} MATCH %s')
+        params.insert(0, ' AND '.join(match))
+    order = 'rank' if match else 'rowid DESC'
+    sql = f'SELECT rowid FROM {TABLE} WHERE {" AND ".join(where)} ORDER BY {order} LIMIT %s'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def fallback_ids(names, digits, limit):
+    # в PostgreSQL icontains/contains идут по GIN-индексам pg_trgm (миграция 0011_patient_search_trigram)
+    queryset = Patient.objects.all()
+    for term in names:
+        queryset = queryset.filter(full_name__icontains=term)
+    for term in digits:
+        queryset = queryset.filter(phone_number__contains=term)
+    return list(queryset.order_by('-created_date').values_list('id', flat=True)[:limit])
+
+
+def matching_ids(query, limit):
+    names, digits = split_query(query)
+    if not names and not digits:
+        return []
+    return fts_ids(names, digits, limit) if uses_fts() else fallback_ids(names, digits, limit)
+
+
+def search_patients(query, limit=20):
+    """Пациенты по части ФИО и/или номера телефона, в порядке релевантности."""
+    ids = matching_ids(query, limit)
+    if not ids:
+        return []
+    patients = Patient.objects.only('id', 'full_name', 'birthday', 'gender', 'phone_number').in_bulk(ids)
+    return [patients[pk] for pk in ids if pk in patients]
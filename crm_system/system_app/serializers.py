@@ -1,8 +1,31 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Department, Service, RecordingTime, Patient
+from .models import Department, Service, RecordingTime, Patient, UserProfile, SlotBooking, MedicalRecord
+from .availability import book_slots, rebook_slots
+from . import history, revenue, search
+from .events import publish_patient
+from .cache import invalidate_queue_cache
 from users.serializers import DoctorProfileForDepartSerializer
 
 
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """Принимает ``fields=[...]`` и оставляет только перечисленные поля."""
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def model_columns(cls, fields=None):
+        """Колонки для ``.only()``: поля модели из fields (или Meta.fields) без вычисляемых."""
+        columns = {field.name for field in cls.Meta.model._meta.concrete_fields}
+        return [name for name in (fields or cls.Meta.fields) if name in columns]
+
+
 class ServiceCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Service
@@ -38,24 +61,195 @@ class RecordingTimeSerializer(serializers.ModelSerializer):
         fields = ["shift_start", "shift_end"]
 
 
+class AvailableSlotSerializer(serializers.ModelSerializer):
+    shift_start = serializers.TimeField(format="%H:%M")
+    shift_end = serializers.TimeField(format="%H:%M")
+    class Meta:
+        model = RecordingTime
+        fields = ["id", "shift_start", "shift_end"]
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    doctor = serializers.PrimaryKeyRelatedField(queryset=UserProfile.objects.filter(role='doctor'))
+    date = serializers.DateField()
+
+
+class PatientExportQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    department = serializers.PrimaryKeyRelatedField(queryset=Department.objects.all(), required=False)
+    file_format = serializers.ChoiceField(choices=["csv", "ndjson"], default="csv")
+
+
+class RevenueReportQuerySerializer(serializers.Serializer):
+    group_by = serializers.ChoiceField(choices=sorted(revenue.REPORT_GROUPS), default="doctor")
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Берёт объект из ``context['prefetched']``, если список заранее загрузил его одним запросом."""
+    def to_internal_value(self, data):
+        cache = self.context.get('prefetched', {}).get(self.get_queryset().model)
+        if cache is not None:
+            try:
+                return cache[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+class PatientBulkCreateSerializer(serializers.ListSerializer):
+    """
+    Массовая запись пациентов: каждая строка валидируется отдельно, ошибки собираются
+    в ``row_errors``, а валидные строки пишутся через bulk_create пачками в одной транзакции.
+    """
+    def prefetch_related_objects(self, data):
+        ids = {}
+        for name, field in self.child.fields.items():
+            relation = getattr(field, 'child_relation', field)
+            if field.read_only or not isinstance(relation, PrefetchedPrimaryKeyRelatedField):
+                continue
+            queryset = relation.get_queryset()
+            for row in data:
+                value = row.get(name) if isinstance(row, dict) else None
+                for pk in (value if isinstance(value, list) else [value]):
+                    if isinstance(pk, (int, str)) and str(pk).isdigit():
+                        ids.setdefault(queryset.model, (queryset, set()))[1].add(int(pk))
+        return {model: queryset.in_bulk(pks) for model, (queryset, pks) in ids.items()}
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({'non_field_errors': ['Ожидается список пациентов.']})
+        self._context['prefetched'] = self.prefetch_related_objects(data)
+        self.row_errors, self.row_indexes, rows = [], [], []
+        for index, item in enumerate(data):
+            try:
+                row = self.child.run_validation(item)
+            except serializers.ValidationError as exc:
+                self.row_errors.append({'index': index, 'errors': exc.detail})
+                continue
+            row.setdefault('appointment_date', timezone.localdate())
+            rows.append(row)
+            self.row_indexes.append(index)
+        return self.reject_taken_slots(rows)
+
+    def slot_keys(self, row):
+        if row.get('type_record', 'queue') == 'cencel':
+            return []
+        return [(row['doctor'].id, row['appointment_date'], slot.id) for slot in row['recording_time']]
+
+    def reject_taken_slots(self, rows):
+        keys = [key for row in rows for key in self.slot_keys(row)]
+        taken = set()
+        if keys:
+            taken = set(SlotBooking.objects.filter(
+                doctor_id__in={key[0] for key in keys},
+                date__in={key[1] for key in keys},
+                recording_time_id__in={key[2] for key in keys},
+            ).values_list('doctor_id', 'date', 'recording_time_id'))
+        accepted, indexes = [], []
+        for index, row in zip(self.row_indexes, rows):
+            row_keys = self.slot_keys(row)
+            if taken.intersection(row_keys) or len(set(row_keys)) != len(row_keys):
+                self.row_errors.append({'index': index, 'errors': {'recording_time': ['Это время у врача уже занято.']}})
+                continue
+            taken.update(row_keys)
+            accepted.append(row)
+            indexes.append(index)
+        self.row_indexes = indexes
+        self.row_errors.sort(key=lambda error: error['index'])
+        return accepted
+
+    def create(self, validated_data):
+        batch_size = getattr(settings, 'PATIENT_BULK_CREATE_BATCH_SIZE', 500)
+        through = Patient.recording_time.through
+        created = []
+        try:
+            with transaction.atomic():
+                for start in range(0, len(validated_data), batch_size):
+                    rows = validated_data[start:start + batch_size]
+                    patients = Patient.objects.bulk_create([
+                        Patient(**{key: value for key, value in row.items()
+                                   if key not in ('recording_time', 'appointment_date')})
+                        for row in rows
+                    ])
+                    links, bookings = [], []
+                    for patient, row in zip(patients, rows):
+                        for slot in row['recording_time']:
+                            links.append(through(patient_id=patient.id, recordingtime_id=slot.id))
+                        for doctor_id, day, slot_id in self.slot_keys(row):
+                            bookings.append(SlotBooking(doctor_id=doctor_id, date=day,
+                                                        recording_time_id=slot_id, patient_id=patient.id))
+                    through.objects.bulk_create(links)
+                    SlotBooking.objects.bulk_create(bookings)
+                    revenue.record(patients)
+                    search.index_patients(patients)
+                    for patient in patients:
+                        publish_patient('created', patient)
+                    created.extend(patients)
+                invalidate_queue_cache()
+        except IntegrityError:
+            raise serializers.ValidationError({'recording_time': 'Это время у врача уже занято.'})
+        return created
+
+
 class PatientCreateSerializer(serializers.ModelSerializer):
-    recording_time = serializers.PrimaryKeyRelatedField(many=True, queryset=RecordingTime.objects.all())
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+    recording_time = PrefetchedPrimaryKeyRelatedField(many=True, queryset=RecordingTime.objects.all())
+    appointment_date = serializers.DateField(write_only=True, required=False)
     # reception =
     # doctor = DoctorProfileForDepartSerializer()
     class Meta:
         model = Patient
         fields = ["full_name", "birthday", "gender", "phone_number", "department", "service",
-                  "recording_time", "doctor", "type_record", "reception", "created_date"]
+                  "recording_time", "doctor", "type_record", "reception", "created_date", "appointment_date"]
+        list_serializer_class = PatientBulkCreateSerializer
 # added doctor, reception
 
+    def create(self, validated_data):
+        day = validated_data.pop('appointment_date', None) or timezone.localdate()
+        slots = validated_data.get('recording_time', [])
+        with transaction.atomic():
+            patient = super().create(validated_data)
+            if patient.type_record != 'cencel':
+                book_slots(patient, slots, day)
+        return patient
+
 
 class PatientUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Patient
         fields = ["department", "service", "recording_time", "type_record", "created_date"]
 
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if 'recording_time' in validated_data or 'type_record' in validated_data:
+                rebook_slots(instance, instance.recording_time.all())
+        return instance
+
+
+class QueuePatientSerializer(serializers.ModelSerializer):
+    created_date = serializers.DateTimeField(format="%d-%m-%Y " "%H:%M")
+    class Meta:
+        model = Patient
+        fields = ["id", "full_name", "phone_number", "doctor", "department", "service", "recording_time",
+                  "type_record", "created_date"]
+
 
-class PatientDataSerializer(serializers.ModelSerializer):
+class PatientSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Patient
+        fields = ["id", "full_name", "birthday", "gender", "phone_number"]
+
+
+class PatientSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+
+class PatientDataSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Patient
         fields = ["full_name", "gender", "phone_number"]
@@ -69,8 +263,46 @@ class PatientDataSerializer(serializers.ModelSerializer):
 #                   "type_record", "created_date"]
 
 
-class PatientDataForDoctorSerializer(serializers.ModelSerializer):
+class MedicalHistoryField(serializers.CharField):
+    """Последняя версия истории болезни; выводится, только если view подгрузила её (history.attach_latest)."""
+    skip_in_lists = True  # списки её не подгружают (system_app.fast_serializers)
+
+    def get_attribute(self, instance):
+        if not hasattr(instance, 'latest_medical_history'):
+            raise serializers.SkipField()
+        return instance.latest_medical_history
+
+
+class PatientDataForDoctorSerializer(DynamicFieldsModelSerializer):
     created_date = serializers.DateTimeField(format="%d-%m-%Y " "%H:%M")
+    medical_history = MedicalHistoryField(required=False, allow_blank=True, allow_null=True)
     class Meta:
         model = Patient
-        fields = ["full_name", "gender", "phone_number", "medical_history", "created_date"]
\ No newline at end of file
+        fields = ["full_name", "gender", "phone_number", "medical_history", "created_date"]
+
+    def save_history(self, patient, text):
+        if text is not None:
+            request = self.context.get('request')
+            author = request.user if request is not None and isinstance(request.user, UserProfile) else None
+            history.append(patient, text, author)
+            patient.latest_medical_history = text
+        return patient
+
+    def create(self, validated_data):
+        text = validated_data.pop('medical_history', None)
+        with transaction.atomic():
+            return self.save_history(super().create(validated_data), text)
+
+    def update(self, instance, validated_data):
+        text = validated_data.pop('medical_history', None)
+        with transaction.atomic():
+            return self.save_history(super().update(instance, validated_data), text)
+
+
+class MedicalRecordSerializer(serializers.ModelSerializer):
+    text = serializers.CharField(read_only=True)
+    author = serializers.CharField(source='author.fio', default=None, read_only=True)
+    created_date = serializers.DateTimeField(format="%d-%m-%Y " "%H:%M")
+    class Meta:
+        model = MedicalRecord
+        fields = ["version", "text", "author", "created_date"]
\ No newline at end of file
@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.backends.signals import connection_created
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import revenue, search
+from .archive import archiving
+from .events import publish_patient
+from .cache import invalidate_queue_cache, invalidate_reference_cache
+from .thumbnails import file_digest, original_path, schedule_profile_picture
+from .models import Department, Patient, RecordingTime, Service, Specialty, UserProfile
+from users.tokens import forget_token_version
+
+
+@receiver(pre_save, sender=Patient)
+def remember_patient_state(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        instance._state_before_save = None
+        return
+    instance._state_before_save = (Patient.objects.select_related('service')
+                                   .only('created_date', 'type_record', 'doctor_id', 'department_id',
+                                         'service__service_price')
+                                   .filter(pk=instance.pk).first())
+
+
+@receiver(post_save, sender=Patient)
+def update_revenue_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    revenue.replace(getattr(instance, '_state_before_save', None), instance)
+
+
+@receiver(pre_delete, sender=Patient)
+def update_revenue_on_delete(sender, instance, **kwargs):
+    if not archiving.get():
+        revenue.replace(instance, None)
+
+
+@receiver(post_save, sender=Patient)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_patients([instance])
+
+
+@receiver(post_delete, sender=Patient)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_patient(instance.id)
+
+
+@receiver(post_save, sender=Patient)
+def publish_queue_event(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_state_before_save', None)
+    if created:
+        event_type = 'created'
+    elif instance.type_record == 'cencel' and (before is None or before.type_record != 'cencel'):
+        event_type = 'cancelled'
+    else:
+        event_type = 'updated'
+    publish_patient(event_type, instance, before)
+
+
+@receiver(post_delete, sender=Patient)
+def publish_queue_delete(sender, instance, **kwargs):
+    if not archiving.get():
+        publish_patient('deleted', instance)
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+@receiver(m2m_changed, sender=Patient.recording_time.through)
+def queue_changed(sender, **kwargs):
+    invalidate_queue_cache()
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Specialty)
+@receiver(post_delete, sender=Specialty)
+@receiver(post_save, sender=RecordingTime)
+@receiver(post_delete, sender=RecordingTime)
+def reference_data_changed(sender, **kwargs):
+    invalidate_reference_cache()
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def doctor_changed(sender, instance, **kwargs):
+    # врач вложен в ответ /system/department/
+    if instance.role == 'doctor':
+        invalidate_reference_cache()
+
+
+@receiver(m2m_changed, sender=UserProfile.specialty.through)
+def doctor_specialty_changed(sender, **kwargs):
+    invalidate_reference_cache()
+
+
+@receiver(pre_save, sender=UserProfile)
+def bump_token_version(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not instance.pk:
+        return
+    fields = UserProfile.TOKEN_CLAIM_FIELDS
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return
+    before = UserProfile.objects.filter(pk=instance.pk).values('token_version', *fields).first()
+    if before and any(before[name] != getattr(instance, name) for name in fields):
+        # отдельным UPDATE, чтобы версия сохранилась и при save(update_fields=[...])
+        instance.token_version = before['token_version'] + 1
+        UserProfile.objects.filter(pk=instance.pk).update(token_version=instance.token_version)
+        forget_token_version(instance.pk)
+        transaction.on_commit(lambda: forget_token_version(instance.pk))
+
+
+@receiver(pre_save, sender=UserProfile)
+def hash_profile_picture(sender, instance, raw=False, **kwargs):
+    picture = instance.profile_picture
+    if raw:
+        return
+    if not picture:
+        instance.profile_picture_hash, instance.profile_picture_processed = '', False
+        return
+    if getattr(picture, '_committed', True):
+        return
+    digest = file_digest(picture)
+    if digest != instance.profile_picture_hash:
+        instance.profile_picture_hash, instance.profile_picture_processed = digest, False
+    path = original_path(digest, picture.name)
+    if default_storage.exists(path):
+        # такой файл уже загружен — ссылаемся на него, а не сохраняем копию
+        picture.name, picture._committed = path, True
+
+
+@receiver(post_save, sender=UserProfile)
+def process_profile_picture(sender, instance, raw=False, **kwargs):
+    if raw or not instance.profile_picture_hash or instance.profile_picture_processed:
+        return
+    user_id, source, digest = instance.pk, instance.profile_picture.name, instance.profile_picture_hash
+    transaction.on_commit(lambda: schedule_profile_picture(user_id, source, digest))
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name}={value}')
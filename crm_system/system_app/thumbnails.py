@@ -0,0 +1,89 @@
+"""
+Уменьшенные копии profile_picture: квадратные WebP и JPEG нескольких размеров.
+Обрабатываются в фоне после коммита; одинаковые картинки (по sha256) обрабатываются и хранятся один раз.
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+from .cache import invalidate_reference_cache
+
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+_pool = None
+
+
+def sizes():
+    return getattr(settings, 'PROFILE_PICTURE_SIZES', {'small': 64, 'medium': 160, 'large': 400})
+
+
+def file_digest(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def original_path(digest, filename):
+    ext = os.path.splitext(filename)[1].lower() or '.jpg'
+    return f'profiles/{digest[:2]}/{digest}{ext}'
+
+
+def rendition_path(digest, size, fmt):
+    return f'profiles/renditions/{digest}/{size}.{fmt}'
+
+
+def rendition_urls(digest):
+    return {size: {fmt: default_storage.url(rendition_path(digest, size, fmt)) for fmt in FORMATS}
+            for size in sizes()}
+
+
+def make_renditions(source_name, digest):
+    """Создаёт недостающие копии; уже существующие (тот же хеш) не пересчитываются."""
+    missing = [(size, px, fmt) for size, px in sizes().items() for fmt in FORMATS
+               if not default_storage.exists(rendition_path(digest, size, fmt))]
+    if not missing:
+        return
+    with default_storage.open(source_name, 'rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    for size, px, fmt in missing:
+        thumb = ImageOps.fit(image.convert('RGB'), (px, px), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        thumb.save(buffer, FORMATS[fmt], quality=82)
+        default_storage.save(rendition_path(digest, size, fmt), ContentFile(buffer.getvalue()))
+
+
+def finish_profile_picture(user_id, source_name, digest):
+    from .models import UserProfile
+    make_renditions(source_name, digest)
+    if UserProfile.objects.filter(pk=user_id, profile_picture_hash=digest).update(profile_picture_processed=True):
+        # врач с аватаром вложен в кэшируемые ответы /system/department/
+        invalidate_reference_cache()
+
+
+def process_in_background(user_id, source_name, digest):
+    close_old_connections()
+    try:
+        finish_profile_picture(user_id, source_name, digest)
+    finally:
+        close_old_connections()
+
+
+def schedule_profile_picture(user_id, source_name, digest):
+    """Фоновая обработка в отдельном потоке; при PROFILE_PICTURE_ASYNC=False — сразу (тесты, команды)."""
+    global _pool
+    if not getattr(settings, 'PROFILE_PICTURE_ASYNC', True):
+        finish_profile_picture(user_id, source_name, digest)
+        return None
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profile-pictures')
+    return _pool.submit(process_in_background, user_id, source_name, digest)
@@ -1,7 +1,10 @@
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter, DefaultRouter
+from . import async_views
 from .views import (DepartmentViewSet, RecordingTimeViewSet, ServiceListAPIView, ServiceCreateAPIView,
-                    PatientCreateAPIView, PatientRetrieveUpdateDestroyAPIView, PatientDataAPIView, PatientDataForDoctorViewSet)
+                    PatientCreateAPIView, PatientRetrieveUpdateDestroyAPIView, PatientDataAPIView, PatientDataForDoctorViewSet,
+                    AvailabilityAPIView, PatientBulkCreateAPIView,
+                    PatientExportAPIView, RevenueReportAPIView, PatientSearchAPIView, BootstrapAPIView)
 
 
 router = DefaultRouter()
@@ -17,7 +20,21 @@ urlpatterns = [
     path("service/create/", ServiceCreateAPIView.as_view(), name="service_create"),
 
     path("patient/create/", PatientCreateAPIView.as_view(), name="patient_create"),
+    path("patient/bulk_create/", PatientBulkCreateAPIView.as_view(), name="patient_bulk_create"),
     path("patient/<int:pk>/", PatientRetrieveUpdateDestroyAPIView.as_view(), name="patient_update"),
     path("patient_data/", PatientDataAPIView.as_view(), name="patient_data"),
+    path("patient/search/", PatientSearchAPIView.as_view(), name="patient_search"),
+    path("patient/export/", PatientExportAPIView.as_view(), name="patient_export"),
+    path("bootstrap/", BootstrapAPIView.as_view(), name="bootstrap"),
+    path("availability/", AvailabilityAPIView.as_view(), name="availability"),
+    path("reports/revenue/", RevenueReportAPIView.as_view(), name="revenue_report"),
+
+    path("async/department/", async_views.department_list, name="async_department_list"),
+    path("async/service/", async_views.service_list, name="async_service_list"),
+    path("async/patient_data_for_doctor/", async_views.patient_data_for_doctor_list,
+         name="async_patient_data_for_doctor_list"),
+    path("async/patient_data_for_doctor/<int:pk>/", async_views.patient_data_for_doctor_detail,
+         name="async_patient_data_for_doctor_detail"),
+    path("events/", async_views.queue_events, name="queue_events"),
     # path("patient_data_for_doctor/", PatientDataForDoctorUpdateAPIView.as_view(), name="patient_data_for_doctor"),
 ]
\ No newline at end of file
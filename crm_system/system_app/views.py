@@ -1,17 +1,67 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render
-from rest_framework import viewsets, generics
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework import viewsets, generics, status
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
 from .serializers import (DepartmentSerializer, ServiceListSerializer, ServiceCreateSerializer, RecordingTimeSerializer,
-                          PatientCreateSerializer, PatientUpdateSerializer, PatientDataSerializer, PatientDataForDoctorSerializer)
-from .models import Department, Service, RecordingTime, Patient
-
-
-class DepartmentViewSet(viewsets.ModelViewSet):
-    queryset = Department.objects.all()
+                          PatientCreateSerializer, PatientUpdateSerializer, PatientDataSerializer, PatientDataForDoctorSerializer,
+                          AvailableSlotSerializer, AvailabilityQuerySerializer, PatientExportQuerySerializer,
+                          RevenueReportQuerySerializer, PatientSearchSerializer, PatientSearchQuerySerializer,
+                          MedicalRecordSerializer)
+from .models import Department, Service, RecordingTime, Patient, MedicalRecord
+from .availability import free_slots
+from .parsers import NDJSONParser
+from .exports import FORMATS, export_querysets
+from .pagination import PatientCursorPagination, MedicalRecordCursorPagination
+from .cache import ReferenceCacheMixin
+from .bootstrap import Snapshot
+from .fast_serializers import FastListMixin
+from . import revenue
+from .history import attach_latest
+from .search import search_patients
+from .metrics import render_prometheus, summarize
+
+
+class PatientFieldsMixin:
+    """
+    Курсорная пагинация и проекция ``?fields=full_name,phone_number`` для списков пациентов:
+    из базы читаются только запрошенные колонки (плюс ключи курсора).
+    """
+    pagination_class = PatientCursorPagination
+
+    def get_requested_fields(self):
+        allowed = self.get_serializer_class().Meta.fields
+        param = self.request.query_params.get('fields')
+        if not param:
+            return None
+        requested = {name.strip() for name in param.split(',')}
+        return [name for name in allowed if name in requested] or None
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            fields = self.get_requested_fields()
+            if fields:
+                kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == 'GET':
+            columns = self.get_serializer_class().model_columns(self.get_requested_fields())
+            queryset = queryset.only('id', 'created_date', *columns)
+        return queryset
+
+
+class DepartmentViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
+    queryset = Department.objects.select_related('doctor').prefetch_related('service_depart', 'doctor__specialty')
     serializer_class = DepartmentSerializer
 
 
-class ServiceListAPIView(generics.ListAPIView):
-    queryset = Service.objects.all()
+class ServiceListAPIView(ReferenceCacheMixin, FastListMixin, generics.ListAPIView):
+    queryset = Service.objects.select_related('department')
     serializer_class = ServiceListSerializer
 
 
@@ -20,7 +70,7 @@ class ServiceCreateAPIView(generics.CreateAPIView):
     serializer_class = ServiceCreateSerializer
 
 
-class RecordingTimeViewSet(viewsets.ModelViewSet):
+class RecordingTimeViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
     queryset = RecordingTime.objects.all()
     serializer_class = RecordingTimeSerializer
 
@@ -30,17 +80,113 @@ class PatientCreateAPIView(generics.CreateAPIView):
     serializer_class = PatientCreateSerializer
 
 
+class PatientBulkCreateAPIView(generics.GenericAPIView):
+    queryset = Patient.objects.all()
+    serializer_class = PatientCreateSerializer
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        patients = serializer.save() if serializer.validated_data else []
+        created = [{'index': index, 'id': patient.id} for index, patient in zip(serializer.row_indexes, patients)]
+        return Response({'created': created, 'errors': serializer.row_errors},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+
+class PatientExportAPIView(generics.GenericAPIView):
+    queryset = Patient.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        query = PatientExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        querysets = export_querysets(params.get('date_from'), params.get('date_to'), params.get('department'))
+        rows, content_type = FORMATS[params['file_format']]
+        response = StreamingHttpResponse(rows(querysets), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="patients.{params["file_format"]}"'
+        return response
+
+
+class PatientSearchAPIView(generics.GenericAPIView):
+    serializer_class = PatientSearchSerializer
+
+    def get(self, request, *args, **kwargs):
+        query = PatientSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        patients = search_patients(query.validated_data['q'], query.validated_data['limit'])
+        return Response(self.get_serializer(patients, many=True).data)
+
+
 class PatientRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Patient.objects.all()
     serializer_class = PatientUpdateSerializer
 
 
-class PatientDataAPIView(generics.ListAPIView):
+class PatientDataAPIView(PatientFieldsMixin, FastListMixin, generics.ListAPIView):
     queryset = Patient.objects.all()
     serializer_class = PatientDataSerializer
 
 
-class PatientDataForDoctorViewSet(viewsets.ModelViewSet):
+class PatientDataForDoctorViewSet(PatientFieldsMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Patient.objects.all()
     serializer_class = PatientDataForDoctorSerializer
 
+    def get_object(self):
+        patient = super().get_object()
+        if self.action == 'retrieve':
+            attach_latest(patient)
+        return patient
+
+    @action(detail=True, pagination_class=MedicalRecordCursorPagination, serializer_class=MedicalRecordSerializer)
+    def history(self, request, pk=None):
+        """Все версии истории болезни пациента, от новой к старой, постранично."""
+        # generics.get_object_or_404 отвечает 404 и на нечисловой pk
+        patient = generics.get_object_or_404(Patient.objects.only('id'), pk=pk)
+        records = MedicalRecord.objects.filter(patient=patient).select_related('author').only(
+            'version', 'content', 'compression', 'created_date', 'author__fio')
+        page = self.paginate_queryset(records)
+        return self.get_paginated_response(MedicalRecordSerializer(page, many=True).data)
+
+
+class BootstrapAPIView(generics.GenericAPIView):
+    """Справочники, врачи и сегодняшняя очередь для старта интерфейса регистратуры."""
+    def get(self, request, *args, **kwargs):
+        snapshot = Snapshot(getattr(request.user, 'role', None) or 'anonymous', request.build_absolute_uri('/'))
+        response = get_conditional_response(request, etag=snapshot.etag)
+        if response is None:
+            response = Response(snapshot.data(self.get_serializer_context()))
+            response['ETag'] = snapshot.etag
+        # состав ответа зависит от роли пользователя, формат — от Accept
+        patch_vary_headers(response, ['Accept', 'Authorization', 'Cookie'])
+        return response
+
+
+class AvailabilityAPIView(generics.GenericAPIView):
+    serializer_class = AvailableSlotSerializer
+
+    def get(self, request, *args, **kwargs):
+        query = AvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        doctor, day = query.validated_data['doctor'], query.validated_data['date']
+        slots = free_slots(doctor.id, day)
+        return Response({
+            'doctor': doctor.id,
+            'date': day,
+            'free': self.get_serializer(slots, many=True).data,
+        })
+
+
+class RevenueReportAPIView(generics.GenericAPIView):
+    def get(self, request, *args, **kwargs):
+        query = RevenueReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(revenue.report(**query.validated_data))
+
+
+def metrics_view(request):
+    # время по эндпоинтам не для посторонних: только адреса из PERF_METRICS_ALLOWED_IPS или сотрудники
+    if request.META.get('REMOTE_ADDR') not in settings.PERF_METRICS_ALLOWED_IPS and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(summarize()), content_type='text/plain; version=0.0.4; charset=utf-8')
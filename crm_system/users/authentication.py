@@ -0,0 +1,69 @@
+from asgiref.sync import sync_to_async
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import acurrent_token_version, ais_session_revoked, current_token_version, is_session_revoked
+
+
+class ClaimsUser(TokenUser):
+    """Пользователь из claims токена: id, username, role, fio — без запроса в БД."""
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @property
+    def role(self):
+        return self.token.get('role')
+
+    @property
+    def fio(self):
+        return self.token.get('fio', '')
+
+    def __str__(self):
+        return f'{self.fio} -- {self.role}'
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Для GET/HEAD/OPTIONS пользователь собирается из claims; в БД идём только для записи
+    или если ``ver`` в токене не совпадает с текущей версией пользователя (смена роли, ФИО, пароля).
+    """
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        token = self.get_validated_token(raw_token)
+        if is_session_revoked(token):
+            raise AuthenticationFailed('Сессия завершена.', code='token_revoked')
+        return self.get_user_for_request(request, token), token
+
+    def get_user_for_request(self, request, token):
+        if request.method not in SAFE_METHODS or 'role' not in token:
+            return self.get_user(token)
+        user_id = token.get(api_settings.USER_ID_CLAIM)
+        if token.get('ver') != current_token_version(user_id):
+            return self.get_user(token)
+        return ClaimsUser(token)
+
+    async def aauthenticate(self, request):
+        """Вариант для async-представлений (только чтение): cache и ORM вызываются асинхронно."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        token = self.get_validated_token(raw_token)
+        if await ais_session_revoked(token):
+            raise AuthenticationFailed('Сессия завершена.', code='token_revoked')
+        user_id = token.get(api_settings.USER_ID_CLAIM)
+        if 'role' in token and token.get('ver') == await acurrent_token_version(user_id):
+            return ClaimsUser(token), token
+        return await sync_to_async(self.get_user)(token), token
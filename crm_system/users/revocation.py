@@ -0,0 +1,147 @@
+"""
+Отзыв refresh-токенов вместо таблиц token_blacklist. В RevokedToken хранится только jti и срок
+жизни токена, истёкшие строки удаляет ``manage.py purge_revoked_tokens``. Перед таблицей —
+фильтр Блума в памяти процесса: для неотозванного токена проверка обходится одним чтением
+ревизии из кэша, в БД идём только при совпадении в фильтре (отзыв или ложное срабатывание).
+Ревизию другие процессы видят только через общий кэш (Redis, Memcached): с кэшем в памяти
+процесса фильтр не используется и каждая проверка идёт в БД.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from system_app.models import RevokedToken
+
+REVISION_KEY = 'auth:revocation:revision'
+# запас на транзакции, закоммиченные позже, чем записано их revoked_at
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, step = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+def cache_is_shared():
+    shared = settings.TOKEN_REVOCATION_SHARED_CACHE
+    if shared is None:
+        shared = not isinstance(caches['default'], (LocMemCache, DummyCache))
+    return shared
+
+
+def revoked_tokens():
+    # отзыв проверяется только на primary: реплика может отставать
+    return RevokedToken.objects.using(DEFAULT_DB_ALIAS)
+
+
+class RevocationStore:
+    """
+    Фильтр перестраивается из БД раз в TOKEN_REVOCATION_REBUILD_SECONDS (заодно уходят истёкшие jti),
+    а между перестройками догружает новые отзывы, когда в кэше меняется ревизия или прошло
+    TOKEN_REVOCATION_SYNC_SECONDS (на случай потерянной ревизии — вытеснение, сбой кэша).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.revision = None
+        self.synced_at = None
+        self.built_at = 0.0
+        self.checked_at = 0.0
+
+    def rebuild(self):
+        now = timezone.now()
+        jtis = list(revoked_tokens().filter(expires_at__gt=now).values_list('jti', flat=True))
+        bloom = BloomFilter(max(settings.TOKEN_REVOCATION_BLOOM_CAPACITY, 2 * len(jtis)),
+                            settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE)
+        for jti in jtis:
+            bloom.add(jti)
+        self.bloom, self.synced_at = bloom, now
+        self.built_at = self.checked_at = time.monotonic()
+
+    def sync(self):
+        revision = cache.get(REVISION_KEY)
+        with self.lock:
+            stale = time.monotonic() - self.checked_at > settings.TOKEN_REVOCATION_SYNC_SECONDS
+            if self.bloom is None or time.monotonic() - self.built_at > settings.TOKEN_REVOCATION_REBUILD_SECONDS:
+                self.revision = revision
+                self.rebuild()
+            elif revision != self.revision or stale:
+                self.revision, self.checked_at, now = revision, time.monotonic(), timezone.now()
+                for jti in revoked_tokens().filter(revoked_at__gte=self.synced_at - SYNC_OVERLAP).values_list(
+                        'jti', flat=True):
+                    self.bloom.add(jti)
+                self.synced_at = now
+
+    def is_revoked(self, jti):
+        if cache_is_shared():
+            self.sync()
+            if jti not in self.bloom:
+                return False
+        return revoked_tokens().filter(jti=jti, expires_at__gt=timezone.now()).exists()
+
+    def revoke(self, jti, expires_at):
+        revoked_tokens().bulk_create([RevokedToken(jti=jti, expires_at=expires_at)], ignore_conflicts=True)
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+        # другие процессы увидят новую ревизию и догрузят отзыв из БД
+        transaction.on_commit(lambda: cache.set(REVISION_KEY, time.time_ns(), None))
+
+    def reset(self):
+        with self.lock:
+            self.bloom = None
+
+
+store = RevocationStore()
+
+
+def delete_in_batches(queryset, batch_size, pause, log, name):
+    total = 0
+    while ids := list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size]):
+        with transaction.atomic():
+            queryset.filter(pk__in=ids).delete()
+        total += len(ids)
+        log(f'{name}: удалено {total}')
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def purge_expired(batch_size=5000, pause=0.0, log=print):
+    """
+    Удаляет истёкшие отзывы и старые строки token_blacklist (BlacklistedToken уходит каскадом)
+    пачками по первичному ключу: каждая пачка — короткая транзакция без долгих блокировок.
+    """
+    now = timezone.now()
+    totals = {
+        'revoked': delete_in_batches(revoked_tokens().filter(expires_at__lte=now), batch_size, pause, log,
+                                     'отозванные'),
+        'outstanding': delete_in_batches(OutstandingToken.objects.filter(expires_at__lte=now), batch_size, pause,
+                                         log, 'token_blacklist'),
+    }
+    store.reset()
+    return totals
@@ -1,6 +1,11 @@
 from rest_framework import serializers
 from system_app.models import Specialty, UserProfile
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from .revocation import store
+from .tokens import ClaimsRefreshToken, is_session_revoked, revoke_session
+from system_app.thumbnails import rendition_urls
 from django.contrib.auth import authenticate
 
 
@@ -21,7 +26,7 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         return user
 
     def to_representation(self, instance):
-        refresh = RefreshToken.for_user(instance)
+        refresh = ClaimsRefreshToken.for_user(instance)
         return {
             'user': {
                 'username': instance.username,
@@ -43,7 +48,7 @@ class LoginSerializers(serializers.Serializer):
         raise serializers.ValidationError("Неверные учетные данные")
 
     def to_representation(self, instance):
-        refresh = RefreshToken.for_user(instance)
+        refresh = ClaimsRefreshToken.for_user(instance)
         return {
             'user': {
                 'username': instance.username,
@@ -63,29 +68,65 @@ class LogoutSerializer(serializers.Serializer):
 
     def save(self, **kwargs):
         try:
-            token = RefreshToken(self.token)
+            token = ClaimsRefreshToken(self.token)
             token.blacklist()
+            revoke_session(token)
         except Exception as e:
             raise serializers.ValidationError({'detail': 'Invalid or already revoked token'})
 
 
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenVerifySerializer(serializers.Serializer):
+    token = serializers.CharField(write_only=True)
+
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        if store.is_revoked(token.get(api_settings.JTI_CLAIM, '')) or is_session_revoked(token):
+            raise serializers.ValidationError('Токен отозван.')
+        return {}
+
+
 class SpecialtySerializer(serializers.ModelSerializer):
     class Meta:
         model = Specialty
         fields = ['specialty_name']
 
 
-class DoctorProfileSerializer(serializers.ModelSerializer):
+class ProfilePictureRenditionsMixin(serializers.Serializer):
+    """Ссылки на уменьшенные копии аватара; пока они не готовы — null (клиент берёт profile_picture)."""
+    profile_picture_renditions = serializers.SerializerMethodField()
+    # колонки, которые читает метод, для быстрых списков (system_app.fast_serializers)
+    values_columns = {'profile_picture_renditions': ('profile_picture_processed', 'profile_picture_hash')}
+
+    def get_profile_picture_renditions(self, obj):
+        if not obj.profile_picture_processed:
+            return None
+        urls = rendition_urls(obj.profile_picture_hash)
+        request = self.context.get('request')
+        if request is not None:
+            urls = {size: {fmt: request.build_absolute_uri(url) for fmt, url in formats.items()}
+                    for size, formats in urls.items()}
+        return urls
+
+
+class DoctorProfileSerializer(ProfilePictureRenditionsMixin, serializers.ModelSerializer):
     class Meta:
         model = UserProfile
-        fields = ['fio', 'username', 'profile_picture', 'age', 'role', 'phone_number',
-                  'specialty', 'experience', 'bonus_doctor', 'created_date']
+        fields = ['fio', 'username', 'profile_picture', 'profile_picture_renditions', 'age', 'role',
+                  'phone_number', 'specialty', 'experience', 'bonus_doctor', 'created_date']
 
 
-class DoctorProfileForDepartSerializer(serializers.ModelSerializer):
+class DoctorProfileForDepartSerializer(ProfilePictureRenditionsMixin, serializers.ModelSerializer):
     class Meta:
         model = UserProfile
-        fields = ['fio', 'profile_picture', 'age', 'phone_number',
+        fields = ['fio', 'profile_picture', 'profile_picture_renditions', 'age', 'phone_number',
                   'specialty', 'experience', 'created_date']
 
 
@@ -95,10 +136,11 @@ class ReceptionProfileSerializer(serializers.ModelSerializer):
         fields = ['fio', 'username', 'role', 'phone_number']
 
 
-class AdminProfileSerializer(serializers.ModelSerializer):
+class AdminProfileSerializer(ProfilePictureRenditionsMixin, serializers.ModelSerializer):
     class Meta:
         model = UserProfile
-        fields = ['fio','username', 'profile_picture', 'age', 'role', 'phone_number', 'created_date']
+        fields = ['fio','username', 'profile_picture', 'profile_picture_renditions', 'age', 'role',
+                  'phone_number', 'created_date']
 
 
 
@@ -1,3 +1,285 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.apps import apps as django_apps
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from PIL import Image
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from system_app.models import RevokedToken, UserProfile
+from system_app.thumbnails import rendition_path
+from .authentication import ClaimsJWTAuthentication, ClaimsUser
+from .revocation import RevocationStore, store
+from .serializers import DoctorProfileSerializer
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        store.reset()
+        self.user = UserProfile.objects.create_user(username='doctor', password='secret-pass-1', fio='Асанов Бакыт',
+                                                    role='doctor')
+        self.client = APIClient()
+        response = self.client.post(reverse('login'), {'username': 'doctor', 'password': 'secret-pass-1'})
+        self.access, self.refresh = response.data['access'], response.data['refresh']
+        self.factory = APIRequestFactory()
+
+    def authenticate(self, method='get', token=None):
+        request = getattr(self.factory, method)('/', HTTP_AUTHORIZATION=f'Bearer {token or self.access}')
+        request.method = method.upper()
+        return ClaimsJWTAuthentication().authenticate(request)
+
+    def test_token_carries_profile_claims(self):
+        token = AccessToken(self.access)
+        self.assertEqual((token['role'], token['fio'], token['ver']), ('doctor', 'Асанов Бакыт', 0))
+
+    @override_settings(TOKEN_REVOCATION_SHARED_CACHE=True)
+    def test_reads_do_not_query_user(self):
+        self.authenticate()  # прогрев кэша версии
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.id, user.role, user.fio), (self.user.id, 'doctor', 'Асанов Бакыт'))
+
+    @override_settings(TOKEN_REVOCATION_SHARED_CACHE=True)
+    def test_writes_load_user_from_db(self):
+        self.authenticate()  # прогрев фильтра отзывов
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate('post')
+        self.assertIsInstance(user, UserProfile)
+
+    def test_changed_role_falls_back_to_db(self):
+        self.authenticate()
+        self.user.role = 'reception'
+        self.user.save()
+        user, _ = self.authenticate()
+        self.assertIsInstance(user, UserProfile)
+        self.assertEqual(user.role, 'reception')
+
+    def test_unrelated_change_keeps_token_valid(self):
+        self.user.experience = 5
+        self.user.save()
+        user, _ = self.authenticate()
+        self.assertIsInstance(user, ClaimsUser)
+
+    def test_logout_revokes_access_token(self):
+        response = self.client.post(reverse('logout'), {'refresh': self.refresh},
+                                    HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.assertEqual(response.status_code, 205)
+        response = self.client.get(reverse('service_list'), HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivated_user_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('service_list'), HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_process_local_cache_reads_version_from_db(self):
+        self.authenticate()
+        # роль сменили в другом процессе: его сброс версии в LocMemCache сюда не доходит
+        UserProfile.objects.filter(pk=self.user.pk).update(role='reception', token_version=1)
+        user, _ = self.authenticate()
+        self.assertIsInstance(user, UserProfile)
+        self.assertEqual(user.role, 'reception')
+
+    def test_logout_in_other_process_revokes_access_token(self):
+        self.authenticate()
+        token = AccessToken(self.access)
+        RevokedToken.objects.create(jti=f'session:{token["sid"]}', expires_at=timezone.now() + timedelta(hours=1))
+        response = self.client.get(reverse('service_list'), HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_verify_rejects_access_token_after_logout(self):
+        self.client.post(reverse('logout'), {'refresh': self.refresh})
+        response = self.client.post(reverse('token_verify'), {'token': self.access})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.user = UserProfile.objects.create_user(username='reception', password='secret-pass-1', fio='Регистратор',
+                                                    role='reception')
+
+    def login(self, password='secret-pass-1'):
+        return APIClient().post(reverse('login'), {'username': 'reception', 'password': password})
+
+    def test_configured_iterations_used(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_rehash_on_login_when_parameters_change(self):
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=1500):
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1500$'))
+        # выданный при входе токен уже несёт новую версию
+        self.assertEqual(AccessToken(response.data['access'])['ver'], self.user.token_version)
+
+    def test_django_parameters_by_default(self):
+        # без env параметры не задаются, и хешеры берут стандартные Django: старые хеши не ослабляются
+        project = import_module('crm_system.settings')
+        for name in ('PASSWORD_PBKDF2_ITERATIONS', 'PASSWORD_ARGON2_MEMORY_COST', 'PASSWORD_BCRYPT_ROUNDS'):
+            if name not in os.environ:
+                self.assertFalse(hasattr(project, name), name)
+
+    def test_wrong_password_and_unknown_user(self):
+        self.assertEqual(self.login('wrong').status_code, 401)
+        response = APIClient().post(reverse('login'), {'username': 'nobody', 'password': 'x'})
+        self.assertEqual(response.status_code, 401)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PROFILE_PICTURE_ASYNC=False,
+                   PROFILE_PICTURE_SIZES={'small': 32, 'large': 96})
+class ProfilePictureTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, color='red', name='avatar.png'):
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200), color).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def create_doctor(self, username, picture):
+        with self.captureOnCommitCallbacks(execute=True):
+            return UserProfile.objects.create_user(username=username, password='x', role='doctor',
+                                                   profile_picture=picture)
+
+    def test_renditions_created_after_commit(self):
+        doctor = self.create_doctor('doctor', self.upload())
+        doctor.refresh_from_db()
+        self.assertTrue(doctor.profile_picture_processed)
+        self.assertEqual(len(doctor.profile_picture_hash), 64)
+        for size, px in (('small', 32), ('large', 96)):
+            for fmt in ('webp', 'jpeg'):
+                with default_storage.open(rendition_path(doctor.profile_picture_hash, size, fmt)) as file:
+                    self.assertEqual(Image.open(file).size, (px, px))
+
+    def test_same_image_stored_once(self):
+        first = self.create_doctor('first', self.upload(name='a.png'))
+        second = self.create_doctor('second', self.upload(name='b.png'))
+        other = self.create_doctor('other', self.upload('blue'))
+        self.assertEqual(first.profile_picture.name, second.profile_picture.name)
+        self.assertNotEqual(first.profile_picture.name, other.profile_picture.name)
+
+    def test_serializer_urls(self):
+        doctor = self.create_doctor('doctor', self.upload())
+        doctor.refresh_from_db()
+        renditions = DoctorProfileSerializer(doctor).data['profile_picture_renditions']
+        self.assertEqual(set(renditions), {'small', 'large'})
+        self.assertTrue(renditions['small']['webp'].endswith(f'/{doctor.profile_picture_hash}/small.webp'))
+
+    def test_cleared_picture_resets_hash(self):
+        doctor = self.create_doctor('doctor', self.upload())
+        doctor.profile_picture = None
+        doctor.save()
+        self.assertEqual(doctor.profile_picture_hash, '')
+        self.assertIsNone(DoctorProfileSerializer(doctor).data['profile_picture_renditions'])
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        store.reset()
+        UserProfile.objects.create_user(username='reception', password='secret-pass-1', role='reception')
+        self.client = APIClient()
+        response = self.client.post(reverse('login'), {'username': 'reception', 'password': 'secret-pass-1'})
+        self.refresh = response.data['refresh']
+
+    def refresh_token(self, refresh):
+        return self.client.post(reverse('token_refresh'), {'refresh': refresh})
+
+    def test_login_writes_no_outstanding_tokens(self):
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_rotation_revokes_old_refresh_until_it_expires(self):
+        response = self.refresh_token(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        old = RefreshToken(self.refresh, verify=False)
+        revoked = RevokedToken.objects.get()
+        self.assertEqual((revoked.jti, int(revoked.expires_at.timestamp())), (old['jti'], old['exp']))
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 401)
+        self.assertEqual(self.refresh_token(response.data['refresh']).status_code, 200)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_verify_rejects_revoked_refresh(self):
+        url = reverse('token_verify')
+        self.assertEqual(self.client.post(url, {'token': self.refresh}).status_code, 200)
+        self.client.post(reverse('logout'), {'refresh': self.refresh})
+        self.assertEqual(self.client.post(url, {'token': self.refresh}).status_code, 400)
+
+    @override_settings(TOKEN_REVOCATION_SHARED_CACHE=True)
+    def test_unrevoked_lookup_needs_no_query(self):
+        store.is_revoked('warm-up')
+        with self.assertNumQueries(0):
+            self.assertFalse(store.is_revoked('not-revoked'))
+
+    @override_settings(TOKEN_REVOCATION_SHARED_CACHE=True)
+    def test_other_process_picks_up_revocation(self):
+        other = RevocationStore()
+        self.assertFalse(other.is_revoked('jti-1'))
+        with self.captureOnCommitCallbacks(execute=True):
+            store.revoke('jti-1', timezone.now() + timedelta(days=1))
+        self.assertTrue(other.is_revoked('jti-1'))
+
+    @override_settings(TOKEN_REVOCATION_SHARED_CACHE=True, TOKEN_REVOCATION_SYNC_SECONDS=0)
+    def test_lost_revision_is_caught_up_by_periodic_sync(self):
+        other = RevocationStore()
+        self.assertFalse(other.is_revoked('jti-1'))
+        # ревизия в кэше не поменялась (вытеснена, кэш перезапущен)
+        RevokedToken.objects.create(jti='jti-1', expires_at=timezone.now() + timedelta(days=1))
+        self.assertTrue(other.is_revoked('jti-1'))
+
+    def test_process_local_cache_checks_database(self):
+        other = RevocationStore()
+        self.assertFalse(other.is_revoked('jti-1'))
+        # revoke() в другом процессе: его запись ревизии в LocMemCache сюда не доходит
+        RevokedToken.objects.create(jti='jti-1', expires_at=timezone.now() + timedelta(days=1))
+        self.assertTrue(other.is_revoked('jti-1'))
+
+    def test_migration_copies_unexpired_blacklist(self):
+        migration = import_module('system_app.migrations.0012_copy_blacklisted_tokens')
+        past, future = timezone.now() - timedelta(minutes=1), timezone.now() + timedelta(days=1)
+        for jti, expires_at in (('old', past), ('live', future), ('outstanding-only', future)):
+            token = OutstandingToken.objects.create(jti=jti, token='x', expires_at=expires_at)
+            if jti != 'outstanding-only':
+                BlacklistedToken.objects.create(token=token)
+        migration.copy_blacklisted_tokens(django_apps, SimpleNamespace(connection=connection))
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', 'expires_at')), [('live', future)])
+        self.assertTrue(store.is_revoked('live'))
+
+    def test_purge_removes_expired_rows_in_batches(self):
+        past, future = timezone.now() - timedelta(minutes=1), timezone.now() + timedelta(days=1)
+        RevokedToken.objects.bulk_create([RevokedToken(jti=f'old-{i}', expires_at=past) for i in range(3)] +
+                                         [RevokedToken(jti='live', expires_at=future)])
+        legacy = OutstandingToken.objects.create(jti='legacy', token='x', expires_at=past)
+        BlacklistedToken.objects.create(token=legacy)
+        out = StringIO()
+        call_command('purge_revoked_tokens', '--batch-size', '2', stdout=out)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertFalse(BlacklistedToken.objects.exists())
+        self.assertIn('отозванные: удалено 2', out.getvalue())
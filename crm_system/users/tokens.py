@@ -0,0 +1,103 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from system_app.models import UserProfile
+from .revocation import cache_is_shared, store
+
+VERSION_KEY = 'auth:token_version:{}'
+# jti refresh-токена — hex, так что отзыв сессии в RevokedToken с ним не пересечётся
+SESSION_PREFIX = 'session:'
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh-токен с данными пользователя в claims (role, fio, ...): access-токен наследует их,
+    и для чтения пользователя не нужно идти в БД. ``sid`` не меняется при ротации и служит ключом сессии
+    для отзыва при выходе. Отзыв (ротация, выход) хранится в users.revocation, а не в token_blacklist.
+    """
+    @classmethod
+    def for_user(cls, user):
+        # минуя BlacklistMixin.for_user: выданные токены не пишутся в OutstandingToken
+        token = super(BlacklistMixin, cls).for_user(user)
+        token['username'] = user.username
+        token['role'] = user.role
+        token['fio'] = user.fio
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        token['ver'] = user.token_version
+        token['sid'] = token[api_settings.JTI_CLAIM]
+        return token
+
+    def check_blacklist(self):
+        if store.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError('Токен отозван.')
+
+    def blacklist(self):
+        store.revoke(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp']))
+
+    def outstand(self):
+        return None
+
+
+def token_versions():
+    # всегда с primary: отставшая реплика вернула бы старую версию отозванного токена
+    return UserProfile.objects.using(DEFAULT_DB_ALIAS)
+
+
+def current_token_version(user_id):
+    """
+    Версия из БД, если кэш не общий (LocMemCache): сброс версии при сохранении пользователя
+    виден только в процессе, который его сохранил. Из общего кэша — не дольше TOKEN_VERSION_CACHE_SECONDS.
+    """
+    versions = token_versions().filter(pk=user_id).values_list('token_version', flat=True)
+    if not cache_is_shared():
+        return versions.first()
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = versions.first()
+        cache.set(key, version, settings.TOKEN_VERSION_CACHE_SECONDS)
+    return version
+
+
+async def acurrent_token_version(user_id):
+    versions = token_versions().filter(pk=user_id).values_list('token_version', flat=True)
+    if not cache_is_shared():
+        return await versions.afirst()
+    key = VERSION_KEY.format(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = await versions.afirst()
+        await cache.aset(key, version, settings.TOKEN_VERSION_CACHE_SECONDS)
+    return version
+
+
+def forget_token_version(user_id):
+    cache.delete(VERSION_KEY.format(user_id))
+
+
+def revoke_session(token):
+    """
+    Отзывает все access-токены сессии до истечения их срока жизни. Хранится рядом с отозванными
+    refresh-токенами (users.revocation) под ключом ``session:<sid>``, чтобы отзыв видели все процессы.
+    """
+    sid = token.get('sid')
+    if sid:
+        store.revoke(SESSION_PREFIX + sid, timezone.now() + settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'])
+
+
+def is_session_revoked(token):
+    sid = token.get('sid')
+    return bool(sid) and store.is_revoked(SESSION_PREFIX + sid)
+
+
+async def ais_session_revoked(token):
+    sid = token.get('sid')
+    return bool(sid) and await sync_to_async(store.is_revoked)(SESSION_PREFIX + sid)
@@ -4,6 +4,8 @@ from .serializers import *
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.response import Response
 from system_app.models import UserProfile, Specialty
+from system_app.cache import ReferenceCacheMixin
+from system_app.fast_serializers import FastListMixin
 
 
 class UserRegisterView(generics.CreateAPIView):
@@ -37,20 +39,21 @@ class LogoutView(generics.GenericAPIView):
         if not refresh_token:
             return Response({"detail": "Refresh токен отсутствует."}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            token = RefreshToken(refresh_token)
+            token = ClaimsRefreshToken(refresh_token)
             token.blacklist()
+            revoke_session(token)
             return Response({"detail": "Вы вышли из системы."}, status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
             return Response({"detail": "Ошибка обработки токена."}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class SpecialtyViewSet(viewsets.ModelViewSet):
+class SpecialtyViewSet(ReferenceCacheMixin, viewsets.ModelViewSet):
     queryset = Specialty.objects.all()
     serializer_class = SpecialtySerializer
 
 
-class DoctorProfileViewSet(viewsets.ModelViewSet):
-    queryset = UserProfile.objects.filter(role='doctor')
+class DoctorProfileViewSet(FastListMixin, viewsets.ModelViewSet):
+    queryset = UserProfile.objects.filter(role='doctor').prefetch_related('specialty')
     serializer_class = DoctorProfileSerializer
 
 